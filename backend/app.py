@@ -7,6 +7,22 @@ from models.models import db
 from routes.auth import auth_bp
 from routes.products import products_bp
 from routes.payments import payments_bp
+from routes.usage import usage_bp
+from utils.archive import product_archiver
+from utils.compression import response_compressor
+from utils.customer_provisioning import customer_provisioner
+from utils.db_transfer import transfer_cli
+from utils.db_engine import configure_engines
+from utils.dedup import duplicate_index
+from utils.idempotency import idempotency_store
+from utils.pregeneration_pool import pregeneration_pool
+from utils.pricing import pricing_analytics
+from utils.similarity import similarity_index
+from utils.subscription_reconciler import subscription_reconciler
+from utils.subscriptions import subscription_lifecycle
+from utils.template_registry import template_registry
+from utils.token_blocklist import token_blocklist
+from utils.usage_tracker import usage_tracker
 import os
 
 def create_app(config_name=None):
@@ -19,14 +35,31 @@ def create_app(config_name=None):
     
     # Initialize extensions
     db.init_app(app)
+    configure_engines(app, db)
     CORS(app, origins=[app.config.get('FRONTEND_URL', 'http://localhost:3000')])
-    JWTManager(app)
+    jwt = JWTManager(app)
+    jwt.token_in_blocklist_loader(token_blocklist.token_in_blocklist)
+    token_blocklist.init_app(app)
     Migrate(app, db)
+    template_registry.init_app(app)
+    pregeneration_pool.init_app(app)
+    usage_tracker.init_app(app)
+    duplicate_index.init_app(app)
+    similarity_index.init_app(app)
+    pricing_analytics.init_app(app)
+    customer_provisioner.init_app(app)
+    subscription_reconciler.init_app(app)
+    subscription_lifecycle.init_app(app)
+    idempotency_store.init_app(app)
+    product_archiver.init_app(app)
+    response_compressor.init_app(app)
+    app.cli.add_command(transfer_cli)
     
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(products_bp)
     app.register_blueprint(payments_bp)
+    app.register_blueprint(usage_bp)
     
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
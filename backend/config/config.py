@@ -1,25 +1,148 @@
 import os
 from datetime import timedelta
 
+def build_engine_options(database_uri):
+    """Build SQLAlchemy engine options tuned for the given database"""
+    if database_uri.startswith('sqlite'):
+        # SQLite pragmas (WAL, synchronous, mmap) are applied per connection in
+        # utils.db_engine; the driver timeout is how long writers wait on a lock
+        return {
+            'connect_args': {
+                'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000
+            }
+        }
+    
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ['true', 'on', '1']
+    }
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'baddie-reseller-secret-key-2024'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///baddie_reseller.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = build_engine_options(SQLALCHEMY_DATABASE_URI)
+    
+    # SQLite tuning (ignored for server databases)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))  # 256MB
+    
+    # Optional read replica; GET requests are routed to it when configured
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {
+        'replica': dict(build_engine_options(DATABASE_REPLICA_URL), url=DATABASE_REPLICA_URL)
+    } if DATABASE_REPLICA_URL else {}
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-string'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    JWT_BLOCKLIST_REFRESH_INTERVAL = int(os.environ.get('JWT_BLOCKLIST_REFRESH_INTERVAL', 5))  # Seconds other workers' revocations may lag
+    JWT_BLOCKLIST_BLOOM_CAPACITY = int(os.environ.get('JWT_BLOCKLIST_BLOOM_CAPACITY', 100000))  # Grows on rebuild
+    JWT_BLOCKLIST_BLOOM_ERROR_RATE = float(os.environ.get('JWT_BLOCKLIST_BLOOM_ERROR_RATE', 0.001))
+    JWT_BLOCKLIST_SWEEP_BATCH_SIZE = int(os.environ.get('JWT_BLOCKLIST_SWEEP_BATCH_SIZE', 1000))
     
     # OpenAI Configuration
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     
+    # LLM token accounting
+    LLM_MAX_TOKENS = int(os.environ.get('LLM_MAX_TOKENS', 800))  # Upper bound for adaptive max_tokens
+    LLM_MIN_MAX_TOKENS = int(os.environ.get('LLM_MIN_MAX_TOKENS', 256))
+    LLM_DAILY_TOKEN_QUOTA = int(os.environ.get('LLM_DAILY_TOKEN_QUOTA', 50000))  # Per user, 0 disables
+    LLM_USAGE_FLUSH_SIZE = int(os.environ.get('LLM_USAGE_FLUSH_SIZE', 50))
+    LLM_USAGE_FLUSH_INTERVAL = int(os.environ.get('LLM_USAGE_FLUSH_INTERVAL', 10))  # Seconds
+    LLM_QUOTA_RECONCILE_INTERVAL = int(os.environ.get('LLM_QUOTA_RECONCILE_INTERVAL', 60))  # Seconds
+    
     # Stripe Configuration
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE')  # e.g. http://localhost:12111 for stripe-mock
+    
+    # Background Stripe customer provisioning
+    STRIPE_PROVISIONING_WORKER = os.environ.get('STRIPE_PROVISIONING_WORKER', 'false').lower() in ['true', 'on', '1']
+    STRIPE_PROVISIONING_INTERVAL = int(os.environ.get('STRIPE_PROVISIONING_INTERVAL', 5))  # Seconds
+    STRIPE_PROVISIONING_BATCH_SIZE = int(os.environ.get('STRIPE_PROVISIONING_BATCH_SIZE', 50))
+    STRIPE_PROVISIONING_MAX_ATTEMPTS = int(os.environ.get('STRIPE_PROVISIONING_MAX_ATTEMPTS', 8))
+    
+    # Subscription reconciliation ('flask stripe reconcile-subscriptions')
+    STRIPE_RECONCILE_PAGE_SIZE = int(os.environ.get('STRIPE_RECONCILE_PAGE_SIZE', 100))  # Stripe maximum
+    
+    # Subscription lifecycle ('flask subscriptions process-due' or the in-process scheduler)
+    SUBSCRIPTION_TRIAL_DAYS = int(os.environ.get('SUBSCRIPTION_TRIAL_DAYS', 7))
+    SUBSCRIPTION_PERIOD_DAYS = int(os.environ.get('SUBSCRIPTION_PERIOD_DAYS', 30))
+    SUBSCRIPTION_GRACE_DAYS = int(os.environ.get('SUBSCRIPTION_GRACE_DAYS', 3))  # Access kept after a failed renewal
+    SUBSCRIPTION_SCHEDULER = os.environ.get('SUBSCRIPTION_SCHEDULER', 'false').lower() in ['true', 'on', '1']
+    SUBSCRIPTION_SCHEDULER_INTERVAL = int(os.environ.get('SUBSCRIPTION_SCHEDULER_INTERVAL', 60))  # Seconds
+    SUBSCRIPTION_SCHEDULER_BATCH_SIZE = int(os.environ.get('SUBSCRIPTION_SCHEDULER_BATCH_SIZE', 500))
     
     # Subscription Configuration
     TRIAL_PRICE_ID = os.environ.get('STRIPE_TRIAL_PRICE_ID')  # $1 trial
     SUBSCRIPTION_PRICE_ID = os.environ.get('STRIPE_SUBSCRIPTION_PRICE_ID')  # Recurring subscription
     
+    # Product templates (demo and fallback generations)
+    PRODUCT_TEMPLATES_PATH = os.environ.get('PRODUCT_TEMPLATES_PATH')
+    PRODUCT_TEMPLATES_RELOAD_INTERVAL = int(os.environ.get('PRODUCT_TEMPLATES_RELOAD_INTERVAL', 5))
+    
+    # Pre-generated product pool
+    PREGEN_POOL_ENABLED = os.environ.get('PREGEN_POOL_ENABLED', 'false').lower() in ['true', 'on', '1']
+    PREGEN_POOL_TARGET_SIZE = int(os.environ.get('PREGEN_POOL_TARGET_SIZE', 20))
+    PREGEN_POOL_LOW_WATER = int(os.environ.get('PREGEN_POOL_LOW_WATER', 5))
+    PREGEN_POOL_BATCH_SIZE = int(os.environ.get('PREGEN_POOL_BATCH_SIZE', 5))  # Listings per LLM call
+    PREGEN_POOL_CATEGORIES = [c.strip() for c in os.environ.get('PREGEN_POOL_CATEGORIES', '').split(',') if c.strip()]
+    
+    # Maximum products per generate request
+    GENERATE_MAX_COUNT = int(os.environ.get('GENERATE_MAX_COUNT', 10))
+    
+    # Near-duplicate detection (MinHash/LSH)
+    DEDUP_MODE = os.environ.get('DEDUP_MODE', 'off')  # off, reject, regenerate
+    DEDUP_THRESHOLD = float(os.environ.get('DEDUP_THRESHOLD', 0.8))  # Estimated Jaccard similarity
+    DEDUP_NUM_PERM = int(os.environ.get('DEDUP_NUM_PERM', 64))
+    DEDUP_BANDS = int(os.environ.get('DEDUP_BANDS', 16))
+    DEDUP_MAX_ATTEMPTS = int(os.environ.get('DEDUP_MAX_ATTEMPTS', 3))
+    
+    # Similar-product search (hashed TF-IDF vectors)
+    SIMILAR_DIMENSIONS = int(os.environ.get('SIMILAR_DIMENSIONS', 256))
+    SIMILAR_CACHE_USERS = int(os.environ.get('SIMILAR_CACHE_USERS', 32))  # Per-user matrices kept in memory
+    SIMILAR_ANN_THRESHOLD = int(os.environ.get('SIMILAR_ANN_THRESHOLD', 50000))  # Catalog size for approximate search
+    SIMILAR_ANN_CANDIDATES = int(os.environ.get('SIMILAR_ANN_CANDIDATES', 2000))
+    
+    # Pricing analytics (per-category price distributions)
+    PRICING_CACHE_TTL = int(os.environ.get('PRICING_CACHE_TTL', 300))  # Seconds
+    PRICING_HISTOGRAM_BINS = int(os.environ.get('PRICING_HISTOGRAM_BINS', 20))
+    PRICING_BAND_PERCENTILES = (
+        float(os.environ.get('PRICING_BAND_LOW_PERCENTILE', 10)),
+        float(os.environ.get('PRICING_BAND_HIGH_PERCENTILE', 90))
+    )
+    PRICING_MIN_SAMPLES = int(os.environ.get('PRICING_MIN_SAMPLES', 20))  # Products needed before clamping
+    PRICING_CLAMP_ENABLED = os.environ.get('PRICING_CLAMP_ENABLED', 'true').lower() in ['true', 'on', '1']
+    
+    # Idempotency-Key support on generation and checkout POSTs
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))  # Seconds a stored response is replayed
+    IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 120))  # Lease before a stuck request is taken over
+    IDEMPOTENCY_WAIT_SECONDS = int(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 30))  # How long duplicates wait before 409
+    IDEMPOTENCY_SWEEP_BATCH_SIZE = int(os.environ.get('IDEMPOTENCY_SWEEP_BATCH_SIZE', 1000))
+    
+    # Cold storage for old products (`flask archive run`)
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))  # Days since the last update
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))
+    ARCHIVE_COMPRESSION_LEVEL = int(os.environ.get('ARCHIVE_COMPRESSION_LEVEL', 9))  # zlib level
+    
+    # Response compression (brotli needs the optional `brotli` package, gzip otherwise)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # Bytes
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+    
+    # Description length in summary listings (GET /api/products?summary=true)
+    PRODUCT_SUMMARY_LENGTH = int(os.environ.get('PRODUCT_SUMMARY_LENGTH', 200))
+    
+    # Database copy to another server (`flask transfer copy TARGET_URL`)
+    TRANSFER_CHUNK_SIZE = int(os.environ.get('TRANSFER_CHUNK_SIZE', 5000))  # Rows per transaction and checkpoint
+    TRANSFER_WORKERS = int(os.environ.get('TRANSFER_WORKERS', 3))  # Tables copied in parallel
+    
     # Frontend URL for redirects
     FRONTEND_URL = os.environ.get('FRONTEND_URL') or 'http://localhost:3000'
     
@@ -36,8 +159,16 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
 
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = build_engine_options('sqlite://')
+    SQLALCHEMY_BINDS = {}
+    STRIPE_SECRET_KEY = None
+
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
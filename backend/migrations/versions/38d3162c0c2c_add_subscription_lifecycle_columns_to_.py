@@ -0,0 +1,46 @@
+"""add subscription lifecycle columns to user
+
+Revision ID: 38d3162c0c2c
+Revises:
+Create Date: 2026-10-19 13:28:50.104300
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '38d3162c0c2c'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _user_columns():
+    inspector = sa.inspect(op.get_bind())
+    if 'user' not in inspector.get_table_names():
+        return None  # Fresh database: db.create_all() builds the current schema
+    return {column['name'] for column in inspector.get_columns('user')}
+
+
+def upgrade():
+    # Databases created before the lifecycle engine only get these columns here;
+    # ones created by db.create_all() since then already have them
+    columns = _user_columns()
+    if columns is None:
+        return
+    if 'current_period_end' not in columns:
+        op.add_column('user', sa.Column('current_period_end', sa.DateTime(), nullable=True))
+    if 'cancel_at_period_end' not in columns:
+        op.add_column('user', sa.Column('cancel_at_period_end', sa.Boolean(), nullable=False, server_default=sa.false()))
+    if 'next_transition_at' not in columns:
+        op.add_column('user', sa.Column('next_transition_at', sa.DateTime(), nullable=True))
+        op.create_index('ix_user_next_transition_at', 'user', ['next_transition_at'])
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_index('ix_user_next_transition_at')
+        batch_op.drop_column('next_transition_at')
+        batch_op.drop_column('cancel_at_period_end')
+        batch_op.drop_column('current_period_end')
@@ -1,8 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from utils.clock import clock
+from utils.db_engine import RoutingSession
 import bcrypt
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -13,10 +15,15 @@ class User(db.Model):
     
     # Stripe related fields
     stripe_customer_id = db.Column(db.String(100), unique=True, nullable=True)
-    subscription_status = db.Column(db.String(50), default='inactive')  # inactive, trial, active, canceled
+    subscription_status = db.Column(db.String(50), default='inactive')  # inactive, trial, active, past_due, canceled
     subscription_id = db.Column(db.String(100), nullable=True)
     trial_used = db.Column(db.Boolean, default=False)
     
+    # Subscription lifecycle (see utils/subscriptions.py)
+    current_period_end = db.Column(db.DateTime, nullable=True)  # End of the trial, paid period or grace period
+    cancel_at_period_end = db.Column(db.Boolean, default=False, nullable=False)
+    next_transition_at = db.Column(db.DateTime, nullable=True, index=True)  # When the scheduler next moves this user
+    
     # Relationships
     products = db.relationship('Product', backref='user', lazy=True)
     
@@ -30,9 +37,15 @@ class User(db.Model):
             return False
         return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
     
-    def is_subscribed(self):
-        """Check if user has active subscription"""
-        return self.subscription_status in ['trial', 'active']
+    def is_subscribed(self, now=None):
+        """Check if user has active subscription (in memory, no query)"""
+        if self.subscription_status not in ['trial', 'active', 'past_due']:
+            return False
+        if self.next_transition_at is None or (now or clock.now()) < self.next_transition_at:
+            return True
+        # A transition is due but the scheduler has not applied it yet; access ends
+        # if that transition is a cancellation or the end of a grace period
+        return not (self.cancel_at_period_end or self.subscription_status == 'past_due')
     
     def to_dict(self):
         return {
@@ -41,6 +54,8 @@ class User(db.Model):
             'created_at': self.created_at.isoformat(),
             'subscription_status': self.subscription_status,
             'trial_used': self.trial_used,
+            'current_period_end': self.current_period_end.isoformat() if self.current_period_end else None,
+            'cancel_at_period_end': self.cancel_at_period_end,
             'is_subscribed': self.is_subscribed()
         }
 
@@ -63,6 +78,13 @@ class Product(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_product_category_price', 'category', 'price'),  # Covers pricing analytics scans
+        db.Index('ix_product_user_category_price', 'user_id', 'category', 'price'),  # Same, per user
+        # Never reuse ids on SQLite: archived products keep theirs (see utils/archive.py)
+        {'sqlite_autoincrement': True}
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -82,4 +104,144 @@ class MagicLink(db.Model):
     token = db.Column(db.String(100), unique=True, nullable=False)
     expires_at = db.Column(db.DateTime, nullable=False)
     used = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ProductDraft(db.Model):
+    """Pre-generated product waiting to be claimed by a user"""
+    __table_args__ = (
+        db.Index('ix_product_draft_unclaimed', 'category', 'claimed_by'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(100), nullable=False)  # Normalized category key
+    
+    # Product details
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    keywords = db.Column(db.Text, nullable=True)  # JSON string of keywords
+    prompt_used = db.Column(db.Text, nullable=True)
+    ai_model = db.Column(db.String(50), default='gpt-4o-mini')
+    
+    # Share of the generating completion's tokens, charged to the claiming user
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Claim state
+    claimed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class LLMUsage(db.Model):
+    """Append-only log of tokens consumed by LLM calls"""
+    __tablename__ = 'llm_usage'
+    __table_args__ = (
+        db.Index('ix_llm_usage_user_created', 'user_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Null for background generation
+    category = db.Column(db.String(100), nullable=True)
+    model = db.Column(db.String(50), nullable=False)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)
+    total_tokens = db.Column(db.Integer, nullable=False, default=0)
+    max_tokens = db.Column(db.Integer, nullable=True)  # Limit requested for the call
+    listings = db.Column(db.Integer, nullable=False, default=1)  # Products returned by the call
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class ProductSignature(db.Model):
+    """MinHash signature of a product's title and description"""
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    signature = db.Column(db.LargeBinary, nullable=False)  # Packed unsigned 64-bit minhashes
+
+class ProductLSHBucket(db.Model):
+    """LSH band bucket of a product signature, used to find near-duplicate candidates"""
+    __tablename__ = 'product_lsh_bucket'
+    __table_args__ = (
+        db.Index('ix_product_lsh_bucket_user_bucket', 'user_id', 'bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    bucket = db.Column(db.BigInteger, nullable=False)  # Hash of (band, band minhashes)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+
+class StripeCustomerOutbox(db.Model):
+    """Pending Stripe customer creations, processed outside the signup request"""
+    __tablename__ = 'stripe_customer_outbox'
+    __table_args__ = (
+        db.Index('ix_stripe_customer_outbox_due', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False)
+    idempotency_key = db.Column(db.String(100), unique=True, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, done, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_until = db.Column(db.DateTime, nullable=True)  # Lease held by a worker
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    
+    user = db.relationship('User')
+
+class ProductEmbedding(db.Model):
+    """Hashed term-frequency vector of a product, for similarity search"""
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    vector = db.Column(db.LargeBinary, nullable=False)  # float32, L2-normalized
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+class IdempotencyKey(db.Model):
+    """Stored outcome of a POST made with an Idempotency-Key header"""
+    __tablename__ = 'idempotency_key'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_key_user_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of method, path and body
+    status = db.Column(db.String(20), default='in_progress', nullable=False)  # in_progress, completed
+    locked_until = db.Column(db.DateTime, nullable=True)  # Lease held by the executing request
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    response_mimetype = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class ProductArchive(db.Model):
+    """Cold copy of a product untouched for a long time; bulky text is zlib-compressed"""
+    __tablename__ = 'product_archive'
+    __table_args__ = (
+        db.Index('ix_product_archive_user_created', 'user_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Same id as the original product
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    # Kept uncompressed for listings and statistics
+    title = db.Column(db.String(200), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    ai_model = db.Column(db.String(50), nullable=True)
+    
+    payload = db.Column(db.LargeBinary, nullable=False)  # zlib JSON of description, keywords, prompt_used
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class RevokedToken(db.Model):
+    """Revoked JWTs: one token by jti, or every token of a user issued before revoked_at"""
+    __tablename__ = 'revoked_token'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=True)  # Null for user-wide revocations
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    reason = db.Column(db.String(50), nullable=True)  # logout, account_disabled, ...
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # When the revoked token(s) expire anyway
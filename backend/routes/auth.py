@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from models.models import User, MagicLink, db
+from utils.customer_provisioning import customer_provisioner
+from utils.token_blocklist import token_blocklist
 # from utils.stripe_service import StripeService
 # from email_validator import validate_email, EmailNotValidError
 import secrets
@@ -44,10 +46,8 @@ def register():
         db.session.add(user)
         db.session.flush()  # Get user ID before commit
         
-        # Create Stripe customer - commented out for now
-        # customer = stripe_service.create_customer(email, user.id)
-        # user.stripe_customer_id = customer.id
-        user.stripe_customer_id = f"cus_demo_{user.id}"  # Demo customer ID
+        # Stripe customer is created in the background (demo ID without Stripe)
+        customer_provisioner.enqueue(user)
         
         db.session.commit()
         
@@ -116,8 +116,8 @@ def send_magic_link():
         db.session.add(user)
         db.session.flush()
         
-        # Create demo Stripe customer
-        user.stripe_customer_id = f"cus_demo_{user.id}"
+        # Stripe customer is created in the background (demo ID without Stripe)
+        customer_provisioner.enqueue(user)
     
     # Generate magic link token
     token = secrets.token_urlsafe(32)
@@ -175,6 +175,10 @@ def magic_login():
     
     db.session.commit()
     
+    # Disabled accounts (e.g. `flask tokens revoke-user --disable`) get no new tokens
+    if not user.is_active:
+        return jsonify({'error': 'Account is disabled'}), 401
+    
     # Create access token
     from flask_jwt_extended import create_access_token
     access_token = create_access_token(identity=user.id)
@@ -213,4 +217,13 @@ def refresh_token():
     return jsonify({
         'success': True,
         'access_token': access_token
-    }), 200
\ No newline at end of file
+    }), 200
+
+@auth_bp.route('/api/auth/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """Revoke the current access token"""
+    token_blocklist.revoke_token(get_jwt(), user_id=get_jwt_identity(), reason='logout')
+    db.session.commit()
+    
+    return jsonify({'success': True}), 200
\ No newline at end of file
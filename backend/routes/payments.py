@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.models import User, db
+from utils.customer_provisioning import customer_provisioner
+from utils.idempotency import idempotent
+from utils.subscriptions import subscription_lifecycle
 # from utils.stripe_service import StripeService
 # import stripe
 
@@ -9,6 +12,7 @@ payments_bp = Blueprint('payments', __name__)
 
 @payments_bp.route('/api/payments/create-trial-session', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_trial_session():
     """Create Stripe checkout session for $1 trial"""
     current_user_id = get_jwt_identity()
@@ -23,9 +27,11 @@ def create_trial_session():
     if user.is_subscribed():
         return jsonify({'error': 'User already has active subscription'}), 400
     
+    # Create the Stripe customer now if background provisioning hasn't yet
+    customer_provisioner.ensure_customer(user)
+    
     # For demo purposes, simulate subscription activation
-    user.subscription_status = 'trial'
-    user.trial_used = True
+    subscription_lifecycle.start_trial(user)
     db.session.commit()
     
     return jsonify({
@@ -36,6 +42,7 @@ def create_trial_session():
 
 @payments_bp.route('/api/payments/create-subscription-session', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_subscription_session():
     """Create Stripe checkout session for full subscription"""
     current_user_id = get_jwt_identity()
@@ -47,8 +54,11 @@ def create_subscription_session():
     if user.is_subscribed():
         return jsonify({'error': 'User already has active subscription'}), 400
     
+    # Create the Stripe customer now if background provisioning hasn't yet
+    customer_provisioner.ensure_customer(user)
+    
     # For demo purposes, simulate subscription activation
-    user.subscription_status = 'active'
+    subscription_lifecycle.activate(user)
     db.session.commit()
     
     return jsonify({
@@ -94,6 +104,8 @@ def get_subscription_status():
         'status': user.subscription_status,
         'is_subscribed': user.is_subscribed(),
         'trial_used': user.trial_used,
+        'current_period_end': user.current_period_end.isoformat() if user.current_period_end else None,
+        'cancel_at_period_end': user.cancel_at_period_end,
         'stripe_customer_id': user.stripe_customer_id,
         'subscription_id': user.subscription_id
     }
@@ -113,13 +125,14 @@ def cancel_subscription():
     if not user.is_subscribed():
         return jsonify({'error': 'No active subscription found'}), 400
     
-    # For demo purposes, cancel immediately
-    user.subscription_status = 'canceled'
+    # Access continues until the end of the period already paid for
+    ends_at = subscription_lifecycle.cancel(user)
     db.session.commit()
     
     return jsonify({
         'success': True,
-        'message': 'Subscription has been canceled'
+        'message': f"Subscription will end on {ends_at.date().isoformat()}" if ends_at else 'Subscription has been canceled',
+        'ends_at': ends_at.isoformat() if ends_at else None
     }), 200
 
 @payments_bp.route('/api/payments/webhook', methods=['POST'])
@@ -1,71 +1,169 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.models import User, Product, db
+from models.models import User, Product, ProductArchive, db
+from utils.archive import product_archiver
+from utils.dedup import duplicate_index
+from utils.idempotency import idempotent
+from utils.pregeneration_pool import pregeneration_pool
+from utils.pricing import pricing_analytics
+from utils.similarity import similarity_index
+from utils.template_registry import template_registry
+from utils.usage_tracker import usage_tracker
 # from utils.ai_generator import AIProductGenerator
 import json
 
 products_bp = Blueprint('products', __name__)
 # ai_generator = AIProductGenerator()
 
+PRODUCT_FIELDS = ('id', 'title', 'description', 'category', 'price', 'keywords', 'created_at', 'updated_at')
+
+def _parse_fields(fields_param):
+    """Requested product fields in canonical order (id always included), or None for all"""
+    if not fields_param:
+        return None
+    requested = {field.strip() for field in fields_param.split(',') if field.strip()}
+    unknown = requested - set(PRODUCT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(PRODUCT_FIELDS)}")
+    return [field for field in PRODUCT_FIELDS if field in requested or field == 'id']
+
+def _trim_product(product_data, fields, summary_length):
+    """Apply a sparse fieldset and summary truncation to a product dict"""
+    if fields:
+        product_data = {field: product_data[field] for field in fields}
+    description = product_data.get('description')
+    if summary_length and description and len(description) > summary_length:
+        product_data['description'] = description[:summary_length].rstrip() + '...'
+    return product_data
+
+def _collect_product_data(category, user_id, count, on_duplicate):
+    """Gather up to `count` listings for the user, skipping near duplicates of their catalog
+    and of each other; returns (listings, closest catalog duplicate, skipped draft IDs)"""
+    attempts = current_app.config.get('DEDUP_MAX_ATTEMPTS', 3) if on_duplicate == 'regenerate' else 1
+    collected = []
+    accepted_signatures = []
+    skipped_drafts = []
+    duplicate = None
+    
+    for _ in range(attempts):
+        needed = count - len(collected)
+        
+        # Serve pre-generated drafts when the pool has them ready
+        candidates = pregeneration_pool.claim(category, user_id, needed)
+        # For demo purposes, generate sample products instead of using AI
+        candidates += [template_registry.get_template(category) for _ in range(needed - len(candidates))]
+        
+        for product_data in candidates:
+            if on_duplicate != 'off':
+                signature = duplicate_index.signature(product_data['title'], product_data['description'])
+                match = duplicate_index.find_duplicate(
+                    user_id, product_data['title'], product_data['description'], signature=signature
+                )
+                if match is not None:
+                    duplicate = match
+                # Listings in the same request are not indexed yet, so compare with them here
+                if match is not None or any(
+                    duplicate_index.similarity(signature, accepted) >= duplicate_index.threshold
+                    for accepted in accepted_signatures
+                ):
+                    if 'draft_id' in product_data:
+                        skipped_drafts.append(product_data['draft_id'])
+                    continue
+                accepted_signatures.append(signature)
+            collected.append(product_data)
+        
+        if len(collected) == count:
+            break
+    
+    return collected, duplicate, skipped_drafts
+
 @products_bp.route('/api/products/generate', methods=['POST'])
 @jwt_required()
+@idempotent
 def generate_product():
-    """Generate a new product using AI"""
+    """Generate one or more new products using AI"""
     current_user_id = get_jwt_identity()
     user = User.query.get(current_user_id)
     
     if not user or not user.is_subscribed():
         return jsonify({'error': 'Active subscription required'}), 403
     
+    if not usage_tracker.has_quota(current_user_id):
+        return jsonify({'error': 'Daily generation quota exceeded'}), 429
+    
     data = request.get_json()
     if not data or 'category' not in data:
         return jsonify({'error': 'Category is required'}), 400
     
     category = data.get('category')
     
-    # For demo purposes, generate a sample product instead of using AI
-    sample_products = {
-        'Fashion': {
-            'title': 'Baddie Essential Crop Top Collection',
-            'description': 'Elevate your style with this must-have crop top collection. Perfect for the modern baddie lifestyle, featuring premium materials and attention-grabbing designs. These versatile pieces can be styled for any occasion.',
-            'suggested_price': 24.99,
-            'keywords': ['fashion', 'crop top', 'baddie', 'style', 'trendy']
-        },
-        'Accessories': {
-            'title': 'Statement Gold Chain Necklace Set',
-            'description': 'Complete your baddie look with this stunning gold chain necklace set. High-quality materials meet contemporary design in this collection that\'s perfect for layering and making a statement.',
-            'suggested_price': 19.99,
-            'keywords': ['jewelry', 'necklace', 'gold', 'statement', 'accessories']
-        }
-    }
-    
-    product_data = sample_products.get(category, sample_products['Fashion'])
+    max_count = current_app.config.get('GENERATE_MAX_COUNT', 10)
+    count = data.get('count', 1)
+    if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= max_count:
+        return jsonify({'error': f'count must be an integer between 1 and {max_count}'}), 400
+    
+    # off: keep near duplicates, reject: skip them, regenerate: retry before skipping
+    on_duplicate = data.get('on_duplicate', current_app.config.get('DEDUP_MODE', 'off'))
+    if on_duplicate not in ['off', 'reject', 'regenerate']:
+        return jsonify({'error': 'on_duplicate must be off, reject or regenerate'}), 400
     
     try:
-        # Create product in database
-        product = Product(
-            user_id=current_user_id,
-            title=product_data['title'],
-            description=product_data['description'],
-            category=category,
-            price=product_data['suggested_price'],
-            keywords=json.dumps(product_data['keywords']),
-            prompt_used=f"Category: {category}",
-            ai_model="demo-ai"
-        )
+        products_data, duplicate, skipped_drafts = _collect_product_data(category, current_user_id, count, on_duplicate)
+        
+        if not products_data:
+            db.session.rollback()  # Return any claimed drafts to the pool
+            duplicate_id, similarity = duplicate
+            return jsonify({
+                'error': 'Generated product is a near duplicate of an existing product',
+                'duplicate_of': duplicate_id,
+                'similarity': round(similarity, 3)
+            }), 409
         
-        db.session.add(product)
+        # Create products in database
+        products = [
+            Product(
+                user_id=current_user_id,
+                title=product_data['title'],
+                description=product_data['description'],
+                category=category,
+                price=pricing_analytics.clamp_price(category, product_data['suggested_price']),
+                keywords=json.dumps(product_data['keywords']),
+                prompt_used=product_data.get('prompt_used', f"Category: {category}"),
+                ai_model=product_data.get('ai_model', "demo-ai")
+            )
+            for product_data in products_data
+        ]
+        
+        pregeneration_pool.release(skipped_drafts)  # Someone else may use them
+        db.session.add_all(products)
+        db.session.flush()  # Single batched INSERT; gets product IDs for the duplicate index
+        for product in products:
+            duplicate_index.index_product(product)
+            similarity_index.index_product(product)
         db.session.commit()
+        usage_tracker.charge(current_user_id, category, products_data)
+        pricing_analytics.invalidate(current_user_id)
+        
+        response_products = []
+        for product, product_data in zip(products, products_data):
+            response_data = product.to_dict()
+            response_data['keywords'] = product_data['keywords']  # Return as array
+            response_products.append(response_data)
         
-        response_data = product.to_dict()
-        response_data['keywords'] = product_data['keywords']  # Return as array
+        if count == 1:
+            return jsonify({
+                'success': True,
+                'product': response_products[0]
+            }), 201
         
         return jsonify({
             'success': True,
-            'product': response_data
+            'products': response_products,
+            'skipped_duplicates': count - len(response_products)
         }), 201
         
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Product generation error: {str(e)}")
         return jsonify({'error': 'Failed to generate product'}), 500
 
@@ -83,17 +181,56 @@ def get_products():
     per_page = request.args.get('per_page', 10, type=int)
     category = request.args.get('category')
     
+    include_archived = request.args.get('include_archived', 'false').lower() in ['true', '1']
+    
+    # Sparse fieldset (fields=id,title,price) and summary mode (truncated description)
+    try:
+        fields = _parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    summary = request.args.get('summary', 'false').lower() in ['true', '1']
+    summary_length = current_app.config.get('PRODUCT_SUMMARY_LENGTH', 200) if summary else None
+    
+    if include_archived:
+        items, total = product_archiver.listing(current_user_id, category, page, per_page)
+        return jsonify({
+            'products': [_trim_product(item, fields, summary_length) for item in items],
+            'total': total,
+            'pages': -(-total // per_page) if per_page > 0 else 0,
+            'current_page': page,
+            'per_page': per_page
+        }), 200
+    
     query = Product.query.filter_by(user_id=current_user_id)
     
     if category:
         query = query.filter_by(category=category)
     
+    if fields or summary:
+        # Only read the selected columns; in summary mode the database truncates the
+        # description (one extra character tells us whether it was cut)
+        columns = {field: getattr(Product, field) for field in fields or PRODUCT_FIELDS}
+        if 'description' in columns and summary:
+            columns['description'] = db.func.substr(Product.description, 1, summary_length + 1).label('description')
+        query = query.with_entities(*columns.values())
+    
     products = query.order_by(Product.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
+    if fields or summary:
+        items = []
+        for row in products.items:
+            product_data = dict(row._mapping)
+            for field in ('created_at', 'updated_at'):
+                if product_data.get(field):
+                    product_data[field] = product_data[field].isoformat()
+            items.append(_trim_product(product_data, None, summary_length))
+    else:
+        items = [product.to_dict() for product in products.items]
+    
     return jsonify({
-        'products': [product.to_dict() for product in products.items],
+        'products': items,
         'total': products.total,
         'pages': products.pages,
         'current_page': page,
@@ -107,24 +244,54 @@ def get_product(product_id):
     current_user_id = get_jwt_identity()
     product = Product.query.filter_by(id=product_id, user_id=current_user_id).first()
     
-    if not product:
+    # Fall back to cold storage for products that have been archived
+    product_data = product.to_dict() if product else product_archiver.get(product_id, current_user_id)
+    if not product_data:
         return jsonify({'error': 'Product not found'}), 404
     
-    product_data = product.to_dict()
-    if product.keywords:
+    if product_data['keywords']:
         try:
-            product_data['keywords'] = json.loads(product.keywords)
+            product_data['keywords'] = json.loads(product_data['keywords'])
         except json.JSONDecodeError:
             product_data['keywords'] = []
     
     return jsonify({'product': product_data}), 200
 
+@products_bp.route('/api/products/<int:product_id>/similar', methods=['GET'])
+@jwt_required()
+def get_similar_products(product_id):
+    """Get the user's products most similar to a product"""
+    current_user_id = get_jwt_identity()
+    product = Product.query.filter_by(id=product_id, user_id=current_user_id).first()
+    
+    if not product:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    k = min(max(request.args.get('k', 10, type=int), 1), 100)
+    matches = similarity_index.similar(current_user_id, product_id, k=k)
+    
+    products = {
+        match.id: match
+        for match in Product.query.filter(Product.id.in_([match_id for match_id, _ in matches])).all()
+    } if matches else {}
+    
+    similar = []
+    for match_id, score in matches:
+        if match_id in products:
+            product_data = products[match_id].to_dict()
+            product_data['similarity'] = round(score, 4)
+            similar.append(product_data)
+    
+    return jsonify({'product_id': product_id, 'similar': similar}), 200
+
 @products_bp.route('/api/products/<int:product_id>', methods=['PUT'])
 @jwt_required()
 def update_product(product_id):
     """Update a product"""
     current_user_id = get_jwt_identity()
     product = Product.query.filter_by(id=product_id, user_id=current_user_id).first()
+    if not product:
+        product = product_archiver.restore(product_id, current_user_id)  # Editing brings it back
     
     if not product:
         return jsonify({'error': 'Product not found'}), 404
@@ -146,7 +313,13 @@ def update_product(product_id):
         product.keywords = json.dumps(data['keywords']) if isinstance(data['keywords'], list) else data['keywords']
     
     try:
+        if 'title' in data or 'description' in data:
+            duplicate_index.index_product(product)
+        if 'title' in data or 'description' in data or 'keywords' in data:
+            similarity_index.index_product(product)
         db.session.commit()
+        if 'price' in data or 'category' in data:
+            pricing_analytics.invalidate(current_user_id)
         return jsonify({'success': True, 'product': product.to_dict()}), 200
     except Exception as e:
         current_app.logger.error(f"Product update error: {str(e)}")
@@ -160,16 +333,90 @@ def delete_product(product_id):
     product = Product.query.filter_by(id=product_id, user_id=current_user_id).first()
     
     if not product:
+        if product_archiver.delete(product_id, current_user_id):
+            db.session.commit()
+            return jsonify({'success': True}), 200
         return jsonify({'error': 'Product not found'}), 404
     
     try:
+        duplicate_index.remove_product(product.id)
+        similarity_index.remove_product(product.id)
         db.session.delete(product)
         db.session.commit()
+        pricing_analytics.invalidate(current_user_id)
         return jsonify({'success': True}), 200
     except Exception as e:
         current_app.logger.error(f"Product deletion error: {str(e)}")
         return jsonify({'error': 'Failed to delete product'}), 500
 
+@products_bp.route('/api/products/duplicates', methods=['GET'])
+@jwt_required()
+def get_duplicate_products():
+    """Get groups of the user's products that are near duplicates"""
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    groups = duplicate_index.duplicate_groups(current_user_id)
+    product_ids = [product_id for group in groups for product_id in group]
+    products = {
+        product.id: product
+        for product in Product.query.filter(Product.id.in_(product_ids)).all()
+    } if product_ids else {}
+    
+    return jsonify({
+        'groups': [
+            [
+                {
+                    'id': product_id,
+                    'title': products[product_id].title,
+                    'category': products[product_id].category,
+                    'created_at': products[product_id].created_at.isoformat()
+                }
+                for product_id in group if product_id in products
+            ]
+            for group in groups
+        ],
+        'total_groups': len(groups),
+        'duplicate_products': len(product_ids) - len(groups)
+    }), 200
+
+@products_bp.route('/api/categories', methods=['GET'])
+@jwt_required()
+def get_categories():
+    """Get the available product categories"""
+    return jsonify({
+        'categories': template_registry.categories(),
+        'default_category': template_registry.default_category()
+    }), 200
+
+@products_bp.route('/api/products/pool', methods=['GET'])
+@jwt_required()
+def get_pool_metrics():
+    """Get pre-generation pool depth and refill lag"""
+    return jsonify(pregeneration_pool.metrics()), 200
+
+@products_bp.route('/api/products/pricing', methods=['GET'])
+@jwt_required()
+def get_pricing_analytics():
+    """Get price percentiles, histogram, outliers and recommended band per category"""
+    current_user_id = get_jwt_identity()
+    category = request.args.get('category')
+    
+    # user: the caller's own catalog, global: every product in the category
+    scope = request.args.get('scope', 'user')
+    if scope not in ['user', 'global']:
+        return jsonify({'error': 'scope must be user or global'}), 400
+    
+    stats = pricing_analytics.category_stats(
+        user_id=current_user_id if scope == 'user' else None,
+        category=category
+    )
+    
+    return jsonify({'scope': scope, 'categories': stats}), 200
+
 @products_bp.route('/api/products/stats', methods=['GET'])
 @jwt_required()
 def get_product_stats():
@@ -180,18 +427,26 @@ def get_product_stats():
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    total_products = Product.query.filter_by(user_id=current_user_id).count()
+    # Archived products only count when asked for
+    include_archived = request.args.get('include_archived', 'false').lower() in ['true', '1']
+    rows = db.select(Product.category, Product.price).where(Product.user_id == current_user_id)
+    if include_archived:
+        rows = db.union_all(rows, db.select(ProductArchive.category, ProductArchive.price).where(
+            ProductArchive.user_id == current_user_id
+        ))
+    rows = rows.subquery()
+    
+    total_products = db.session.execute(db.select(db.func.count()).select_from(rows)).scalar()
     
     # Get category breakdown
-    categories = db.session.query(
-        Product.category, 
-        db.func.count(Product.id).label('count')
-    ).filter_by(user_id=current_user_id).group_by(Product.category).all()
+    categories = db.session.execute(
+        db.select(rows.c.category, db.func.count().label('count')).group_by(rows.c.category)
+    ).all()
     
     category_stats = {category: count for category, count in categories}
     
     # Calculate average price
-    avg_price = db.session.query(db.func.avg(Product.price)).filter_by(user_id=current_user_id).scalar() or 0
+    avg_price = db.session.execute(db.select(db.func.avg(rows.c.price))).scalar() or 0
     
     return jsonify({
         'total_products': total_products,
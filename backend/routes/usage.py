@@ -0,0 +1,20 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models.models import User
+from utils.usage_tracker import usage_tracker
+
+usage_bp = Blueprint('usage', __name__)
+
+@usage_bp.route('/api/usage/report', methods=['GET'])
+@jwt_required()
+def get_usage_report():
+    """Get the user's LLM token usage with daily, category and model rollups"""
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    
+    return jsonify(usage_tracker.report(current_user_id, days=days)), 200
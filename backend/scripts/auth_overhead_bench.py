@@ -0,0 +1,127 @@
+"""Per-request auth overhead of the JWT revocation check.
+
+Seeds a fresh SQLite file with revoked tokens, then measures the blocklist check
+on its own (a token that was never revoked, a revoked one confirmed in the table,
+and the naive one-query-per-request design it replaces), the filter's false
+positive rate, the initial load and incremental refreshes (which re-read recent
+revocations; the filter count must stay at the number of revoked tokens), and
+whole ``@jwt_required`` requests with no blocklist, the bloom-filter blocklist and
+the naive one.
+
+Usage (from backend/):
+    python scripts/auth_overhead_bench.py [--revoked 100000] [--requests 2000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+from config.config import Config, build_engine_options
+from models.models import RevokedToken, db
+from utils.db_engine import configure_engines
+from utils.token_blocklist import token_blocklist
+
+def make_app(url):
+    # Only the pieces auth needs, so the script runs without the OpenAI/Stripe clients
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(SQLALCHEMY_DATABASE_URI=url, SQLALCHEMY_ENGINE_OPTIONS=build_engine_options(url), SQLALCHEMY_BINDS={})
+    db.init_app(app)
+    configure_engines(app, db)
+    jwt = JWTManager(app)
+    token_blocklist.init_app(app)
+
+    @app.route('/protected')
+    @jwt_required()
+    def protected():
+        return jsonify({'ok': True})
+
+    return app, jwt
+
+def naive_in_blocklist(jwt_header, jwt_payload):
+    return db.session.query(RevokedToken.id).filter_by(jti=jwt_payload['jti']).first() is not None
+
+def per_call_us(function, number):
+    return timeit.timeit(function, number=number) / number * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--revoked', type=int, default=100000, help='Revoked tokens in the table.')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per whole-request measurement.')
+    parser.add_argument('--recent', type=int, default=1000, help='Of those, revoked within the refresh overlap window.')
+    parser.add_argument('--refreshes', type=int, default=20, help='Incremental refreshes to run.')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='auth-bench-')
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    app, jwt = make_app(url)
+    client = app.test_client()
+
+    with app.app_context():
+        db.create_all()
+        now = datetime.utcnow()
+        # Most revoked an hour ago; the recent ones fall in the window every incremental
+        # refresh re-reads, and must not count against the filter's capacity again
+        db.session.execute(db.insert(RevokedToken), [
+            {
+                'jti': str(uuid.uuid4()),
+                'revoked_at': now if i < args.recent else now - timedelta(hours=1),
+                'expires_at': now + timedelta(hours=23)
+            }
+            for i in range(args.revoked)
+        ])
+        db.session.commit()
+        revoked_jti = db.session.query(RevokedToken.jti).first().jti
+        headers = {'Authorization': f"Bearer {create_access_token(identity=1)}"}
+
+        started = time.perf_counter()
+        token_blocklist.refresh()
+        load_ms = (time.perf_counter() - started) * 1000
+        bloom = token_blocklist._bloom
+        print(f"{args.revoked} revoked tokens ({args.recent} recent); filter {bloom.size} bits, {bloom.hashes} hashes")
+        print(f"  initial load:                {load_ms:8.1f} ms")
+
+        started = time.perf_counter()
+        for _ in range(args.refreshes):
+            token_blocklist.refresh()
+        refresh_ms = (time.perf_counter() - started) * 1000 / args.refreshes
+        rebuilt = token_blocklist._bloom is not bloom
+        print(f"  incremental refresh:         {refresh_ms:8.1f} ms each; after {args.refreshes}: "
+              f"count {token_blocklist._bloom.count} of capacity {token_blocklist._bloom.capacity}, "
+              f"{'REBUILT' if rebuilt else 'no rebuild'}")
+
+        # Keep the filter fresh so the per-call figures don't include refreshes
+        token_blocklist.refresh_interval = 3600
+        miss = {'sub': 1, 'iat': int(time.time()), 'jti': str(uuid.uuid4())}
+        hit = {'sub': 1, 'iat': int(time.time()), 'jti': revoked_jti}
+        print(f"  check, token not revoked:    {per_call_us(lambda: token_blocklist.token_in_blocklist({}, miss), 200000):8.2f} us")
+        print(f"  check, revoked (DB confirm): {per_call_us(lambda: token_blocklist.token_in_blocklist({}, hit), 2000):8.2f} us")
+        print(f"  naive DB lookup per check:   {per_call_us(lambda: naive_in_blocklist({}, miss), 2000):8.2f} us")
+
+        probes = 200000
+        false_positives = sum(str(uuid.uuid4()) in token_blocklist._bloom for _ in range(probes))
+        print(f"  false positives:             {false_positives} of {probes} random jtis")
+
+    for label, loader in (
+        ('no blocklist', lambda jwt_header, jwt_payload: False),
+        ('bloom blocklist', token_blocklist.token_in_blocklist),
+        ('naive DB blocklist', naive_in_blocklist)
+    ):
+        jwt.token_in_blocklist_loader(loader)
+        client.get('/protected', headers=headers)  # Warm up
+        elapsed = per_call_us(lambda: client.get('/protected', headers=headers), args.requests)
+        print(f"  GET @jwt_required, {label + ':':20}{elapsed:8.1f} us")
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
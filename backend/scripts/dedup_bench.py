@@ -0,0 +1,129 @@
+"""Near-duplicate detection benchmark for the MinHash/LSH index.
+
+Seeds one user's catalog in a fresh SQLite file with synthetic listings, about 1%
+of them planted near duplicates (one description word changed), and at each
+catalog size times ``signature``, ``find_duplicate`` (for texts that have a near
+duplicate and for fresh ones) and the full ``duplicate_groups`` report. Growth
+between sizes shows lookups stay flat instead of following the catalog size.
+Seeding computes every signature, so 100k products take a few minutes.
+
+Usage (from backend/):
+    python scripts/dedup_bench.py [--sizes 10000,100000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config.config import Config, build_engine_options
+from models.models import Product, ProductLSHBucket, ProductSignature, User, db
+from utils.db_engine import configure_engines
+from utils.dedup import duplicate_index
+
+VOCABULARY = [f"word{i}" for i in range(5000)]
+
+def make_app(url):
+    # Only the database and the index, so the script runs without the OpenAI/Stripe clients
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(SQLALCHEMY_DATABASE_URI=url, SQLALCHEMY_ENGINE_OPTIONS=build_engine_options(url), SQLALCHEMY_BINDS={})
+    db.init_app(app)
+    configure_engines(app, db)
+    duplicate_index.init_app(app)
+    return app
+
+def listing(rng):
+    return ' '.join(rng.choices(VOCABULARY, k=6)), ' '.join(rng.choices(VOCABULARY, k=40))
+
+def near_duplicate(rng, title, description):
+    words = description.split()
+    words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return title, ' '.join(words)
+
+def seed(user_id, texts, start_id, chunk=2000):
+    """Insert products with their signatures and buckets, in bulk"""
+    for offset in range(0, len(texts), chunk):
+        products, signatures, buckets = [], [], []
+        for i, (title, description) in enumerate(texts[offset:offset + chunk], start=start_id + offset):
+            signature = duplicate_index.signature(title, description)
+            products.append({'id': i, 'user_id': user_id, 'title': title, 'description': description, 'category': 'Fashion', 'price': 20.0})
+            signatures.append({'product_id': i, 'user_id': user_id, 'signature': array('Q', signature).tobytes()})
+            buckets.extend(
+                {'user_id': user_id, 'bucket': bucket, 'product_id': i}
+                for bucket in duplicate_index.buckets(signature)
+            )
+        db.session.execute(db.insert(Product), products)
+        db.session.execute(db.insert(ProductSignature), signatures)
+        db.session.execute(db.insert(ProductLSHBucket), buckets)
+        db.session.commit()
+
+def median_ms(function, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='10000,100000', help='Comma-separated catalog sizes, measured in turn.')
+    parser.add_argument('--queries', type=int, default=200, help='find_duplicate calls per kind of text.')
+    parser.add_argument('--duplicate-rate', type=float, default=0.01, help='Share of seeded products that are near duplicates.')
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+
+    rng = random.Random(7)
+    directory = tempfile.mkdtemp(prefix='dedup-bench-')
+    app = make_app(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='dedup-bench@example.com')
+        db.session.add(user)
+        db.session.commit()
+
+        texts = []
+        print(f"threshold {duplicate_index.threshold}, {duplicate_index.num_perm} permutations in {duplicate_index.bands} bands")
+        for size in sizes:
+            started = time.perf_counter()
+            start = len(texts)
+            while len(texts) < size:
+                if texts and rng.random() < args.duplicate_rate:
+                    texts.append(near_duplicate(rng, *rng.choice(texts)))
+                else:
+                    texts.append(listing(rng))
+            seed(user.id, texts[start:], start_id=start + 1)
+            seed_s = time.perf_counter() - started
+
+            fresh = [listing(rng) for _ in range(args.queries)]
+            copies = [near_duplicate(rng, *rng.choice(texts)) for _ in range(args.queries)]
+            signature_ms = median_ms(lambda: duplicate_index.signature(*rng.choice(fresh)), args.queries)
+            fresh_ms = median_ms(lambda: duplicate_index.find_duplicate(user.id, *rng.choice(fresh)), args.queries)
+            copy_ms = median_ms(lambda: duplicate_index.find_duplicate(user.id, *rng.choice(copies)), args.queries)
+            found = sum(duplicate_index.find_duplicate(user.id, *text) is not None for text in copies)
+            false_matches = sum(duplicate_index.find_duplicate(user.id, *text) is not None for text in fresh)
+
+            started = time.perf_counter()
+            groups = duplicate_index.duplicate_groups(user.id)
+            groups_ms = (time.perf_counter() - started) * 1000
+
+            print(f"{size} products (seeded in {seed_s:.0f}s):")
+            print(f"  signature:                    {signature_ms:7.2f} ms")
+            print(f"  find_duplicate, fresh text:   {fresh_ms:7.2f} ms ({false_matches}/{len(fresh)} matched)")
+            print(f"  find_duplicate, near dup:     {copy_ms:7.2f} ms ({found}/{len(copies)} found)")
+            print(f"  duplicate_groups:             {groups_ms:7.0f} ms ({len(groups)} groups, "
+                  f"{sum(len(members) for members in groups)} products)")
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Query latency benchmark for similar-product search, exact and approximate.
+
+For each catalog size a user is seeded in a fresh SQLite file with synthetic
+hashed-TF vectors (sparse, drawn around topic clusters like real listings). The
+user's matrix is built once through ``SimilarityIndex._load`` with Hamming
+signatures, then the same queries run on the exact scan and on the Hamming
+shortlist, with recall@k of the shortlist against the exact ranking. Each path is
+timed through ``similar()`` and again with the per-call cache version check
+skipped, so the ranking cost shows on its own. The size at which the shortlist's
+ranking wins, at acceptable recall, is what ``SIMILAR_ANN_THRESHOLD`` should be.
+1M vectors need about 1 GB of disk and 3 GB of memory.
+
+Usage (from backend/):
+    python scripts/similarity_bench.py [--sizes 10000,100000,1000000] [--queries 50]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from flask import Flask
+from config.config import Config, build_engine_options
+from models.models import ProductEmbedding, User, db
+from utils.db_engine import configure_engines
+from utils.similarity import similarity_index
+
+def make_app(url):
+    # Only the database and the index, so the script runs without the OpenAI/Stripe clients
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(SQLALCHEMY_DATABASE_URI=url, SQLALCHEMY_ENGINE_OPTIONS=build_engine_options(url), SQLALCHEMY_BINDS={})
+    db.init_app(app)
+    configure_engines(app, db)
+    similarity_index.init_app(app)
+    return app
+
+def synthetic_vectors(rng, count, dimensions, topics=500, topic_terms=20, own_terms=10):
+    """Sparse, L2-normalized float32 rows: most terms from the row's topic, a few of its own"""
+    signs = rng.choice([-1.0, 1.0], size=dimensions)  # Feature hashing gives each slot a fixed sign
+    topic_dims = rng.integers(0, dimensions, size=(topics, topic_terms))
+    rows = np.zeros((count, dimensions), dtype=np.float32)
+    topic = rng.integers(0, topics, size=count)
+    picked = np.take_along_axis(
+        topic_dims[topic], rng.random((count, topic_terms)).argsort(axis=1)[:, :topic_terms * 3 // 4], axis=1
+    )
+    columns = np.concatenate([picked, rng.integers(0, dimensions, size=(count, own_terms))], axis=1)
+    values = (1 + np.log1p(rng.random(columns.shape))) * signs[columns]
+    np.add.at(rows, (np.repeat(np.arange(count), columns.shape[1]), columns.ravel()), values.ravel().astype(np.float32))
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    return rows
+
+def seed(user_id, vectors, start_id, chunk=20000):
+    for offset in range(0, len(vectors), chunk):
+        db.session.execute(db.insert(ProductEmbedding), [
+            {'product_id': start_id + offset + i, 'user_id': user_id, 'vector': vector.tobytes()}
+            for i, vector in enumerate(vectors[offset:offset + chunk])
+        ])
+        db.session.commit()
+
+def median_ms(function, queries):
+    timings = []
+    results = []
+    for product_id in queries:
+        started = time.perf_counter()
+        results.append(function(product_id))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Comma-separated catalog sizes, one user each.')
+    parser.add_argument('--queries', type=int, default=50, help='Products searched per size and path.')
+    parser.add_argument('-k', type=int, default=10, help='Results per search.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    directory = tempfile.mkdtemp(prefix='similarity-bench-')
+    app = make_app(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    configured_threshold = similarity_index.ann_threshold
+
+    with app.app_context():
+        db.create_all()
+        print(f"{similarity_index.dimensions} dimensions, shortlist of {similarity_index.ann_candidates}, "
+              f"SIMILAR_ANN_THRESHOLD={configured_threshold}")
+        next_id = 1
+        for size in (int(size) for size in args.sizes.split(',')):
+            user = User(email=f'similarity-bench-{size}@example.com')
+            db.session.add(user)
+            db.session.commit()
+            seed(user.id, synthetic_vectors(rng, size, similarity_index.dimensions), next_id)
+            queries = [int(product_id) for product_id in rng.integers(next_id, next_id + size, size=args.queries)]
+            next_id += size
+
+            # Build once with signatures, then pick the path per query through the threshold
+            similarity_index.ann_threshold = 0
+            started = time.perf_counter()
+            entry = similarity_index._load(user.id)
+            build_ms = (time.perf_counter() - started) * 1000
+
+            def search(product_id):
+                return similarity_index.similar(user.id, product_id, args.k)
+
+            timings = {}
+            for path, threshold in (('exact', size), ('approximate', 0)):
+                similarity_index.ann_threshold = threshold
+                full_ms, results = median_ms(search, queries)
+                # Again with the cache version check skipped, leaving the ranking alone
+                similarity_index._load = lambda user_id: entry
+                rank_ms, _ = median_ms(search, queries)
+                del similarity_index._load
+                timings[path] = (full_ms, rank_ms, results)
+
+            exact, approx = timings['exact'][2], timings['approximate'][2]
+            recall = statistics.mean(
+                len({i for i, _ in found} & {i for i, _ in truth}) / len(truth)
+                for found, truth in zip(approx, exact) if truth
+            )
+            default = 'approximate' if size > configured_threshold else 'exact'
+            print(f"{size} vectors (matrix build {build_ms:.0f} ms, default path {default}):")
+            print(f"  exact scan:         {timings['exact'][0]:7.2f} ms per similar(), {timings['exact'][1]:7.2f} ms ranking")
+            print(f"  Hamming shortlist:  {timings['approximate'][0]:7.2f} ms per similar(), "
+                  f"{timings['approximate'][1]:7.2f} ms ranking, recall@{args.k} {recall:.2f}")
+
+            # Free this user's matrix before the next, larger one
+            similarity_index._cache.clear()
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
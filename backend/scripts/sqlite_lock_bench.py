@@ -0,0 +1,155 @@
+"""Concurrent writer benchmark for the SQLite engine profile.
+
+Runs the same workload twice on a fresh database file: once with the engine as it
+was before the tuning profile (driver defaults, rollback journal) and once with
+the profile the app now applies (``build_engine_options`` plus the WAL and
+busy_timeout pragmas from ``utils.db_engine``). Writer processes commit short
+generate-like transactions while reader processes stream catalog scans, and each
+side reports commits/s, commit latency and "database is locked" errors.
+
+Usage (from backend/):
+    python scripts/sqlite_lock_bench.py [--writers 8] [--readers 4] [--seconds 10]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, exc
+from config.config import Config, build_engine_options
+from models.models import Product, User, db
+from utils.db_engine import _sqlite_pragma_listener
+
+CATEGORIES = ['Fashion', 'Beauty', 'Accessories', 'Home', 'Fitness']
+
+def make_engine(url, profile):
+    if profile == 'baseline':
+        # Flask-SQLAlchemy defaults before the tuning profile: pysqlite's own lock
+        # timeout and SQLite's rollback journal with synchronous=FULL
+        engine = create_engine(url)
+
+        @event.listens_for(engine, 'connect')
+        def rollback_journal(dbapi_connection, connection_record):
+            dbapi_connection.execute('PRAGMA journal_mode=DELETE')
+        return engine
+
+    engine = create_engine(url, **build_engine_options(url))
+    config = {key: getattr(Config, key) for key in dir(Config) if key.startswith('SQLITE_')}
+    event.listen(engine, 'connect', _sqlite_pragma_listener(config))
+    return engine
+
+def seed(url, profile, users, products):
+    engine = make_engine(url, profile)
+    db.metadata.create_all(engine, tables=[User.__table__, Product.__table__])
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {'id': i, 'email': f'bench{i}@example.com', 'cancel_at_period_end': False} for i in range(1, users + 1)
+        ])
+        connection.execute(Product.__table__.insert(), [
+            {
+                'user_id': random.randint(1, users), 'title': f'Seed {i}', 'description': 'Seed product',
+                'category': random.choice(CATEGORIES), 'price': round(random.uniform(5, 150), 2)
+            }
+            for i in range(products)
+        ])
+    engine.dispose()
+
+def writer(url, profile, users, deadline, results):
+    engine = make_engine(url, profile)
+    commits = errors = 0
+    latencies = []
+    while time.monotonic() < deadline:
+        user_id = random.randint(1, users)
+        started = time.monotonic()
+        try:
+            # Shaped like POST /api/products/generate: check the user, insert, touch the user
+            with engine.begin() as connection:
+                connection.execute(db.select(User.__table__.c.id).where(User.__table__.c.id == user_id)).first()
+                connection.execute(Product.__table__.insert().values(
+                    user_id=user_id, title='Bench product', description='Written by the benchmark',
+                    category=random.choice(CATEGORIES), price=round(random.uniform(5, 150), 2)
+                ))
+                connection.execute(User.__table__.update().where(User.__table__.c.id == user_id).values(trial_used=True))
+            commits += 1
+            latencies.append(time.monotonic() - started)
+        except exc.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            errors += 1
+    engine.dispose()
+    results.put(('writer', commits, errors, latencies))
+
+def reader(url, profile, deadline, results):
+    engine = make_engine(url, profile)
+    scans = errors = 0
+    while time.monotonic() < deadline:
+        try:
+            # Streams rows like the pricing and listing scans, holding a read lock meanwhile
+            with engine.connect() as connection:
+                for _ in connection.execute(db.select(Product.__table__.c.category, Product.__table__.c.price)):
+                    pass
+            scans += 1
+        except exc.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            errors += 1
+    engine.dispose()
+    results.put(('reader', scans, errors, []))
+
+def run(profile, args):
+    directory = tempfile.mkdtemp(prefix=f'sqlite-bench-{profile}-')
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    seed(url, profile, args.users, args.products)
+
+    results = multiprocessing.Queue()
+    deadline = time.monotonic() + 1 + args.seconds  # One second for the processes to start
+    processes = [
+        multiprocessing.Process(target=writer, args=(url, profile, args.users, deadline, results))
+        for _ in range(args.writers)
+    ] + [
+        multiprocessing.Process(target=reader, args=(url, profile, deadline, results))
+        for _ in range(args.readers)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    commits = sum(count for role, count, _, _ in outcomes if role == 'writer')
+    write_errors = sum(errors for role, _, errors, _ in outcomes if role == 'writer')
+    scans = sum(count for role, count, _, _ in outcomes if role == 'reader')
+    read_errors = sum(errors for role, _, errors, _ in outcomes if role == 'reader')
+    latencies = sorted(latency for _, _, _, batch in outcomes for latency in batch)
+    p50 = statistics.median(latencies) * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+
+    print(
+        f"{profile:>8}: {commits / args.seconds:7.1f} commits/s, p50 {p50:6.1f} ms, p99 {p99:7.1f} ms, "
+        f"{write_errors} locked writes, {scans} scans, {read_errors} locked reads"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--products', type=int, default=200000, help='Seed rows; bigger makes scans hold locks longer.')
+    parser.add_argument('--profile', choices=['baseline', 'tuned', 'both'], default='both')
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds}s, {args.products} seed products")
+    for profile in (['baseline', 'tuned'] if args.profile == 'both' else [args.profile]):
+        run(profile, args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models.models import db
+from utils.clock import clock
+
+@pytest.fixture
+def app():
+    """App on a fresh in-memory database, with the clock restored afterwards"""
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+    clock.reset()
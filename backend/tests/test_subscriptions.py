@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+import pytest
+from models.models import User, db
+from utils.clock import clock
+from utils.subscriptions import subscription_lifecycle as lifecycle
+
+START = datetime(2026, 1, 1, 12, 0)
+
+@pytest.fixture
+def user(app):
+    clock.freeze(START)
+    user = User(email='lifecycle@example.com')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def stripe_enabled(app):
+    # Renewals are then left to Stripe instead of being renewed locally
+    app.config['STRIPE_SECRET_KEY'] = 'sk_test_lifecycle'
+
+def process_due():
+    counts = lifecycle.process_due()
+    db.session.expire_all()
+    return counts
+
+def test_trial_expiry_starts_grace_period_then_ends_access(user, stripe_enabled):
+    lifecycle.start_trial(user)
+    db.session.commit()
+    trial_end = START + timedelta(days=lifecycle.trial_days)
+    assert user.next_transition_at == trial_end
+
+    clock.advance(days=lifecycle.trial_days, seconds=-1)
+    assert process_due() == {}
+    assert user.is_subscribed()
+
+    clock.advance(seconds=1)
+    assert process_due() == {'past_due': 1}
+    grace_end = trial_end + timedelta(days=lifecycle.grace_days)
+    assert user.subscription_status == 'past_due'
+    assert user.current_period_end == grace_end
+    assert user.next_transition_at == grace_end
+    assert user.is_subscribed()
+
+    clock.advance(days=lifecycle.grace_days)
+    assert not user.is_subscribed()  # Due but not processed yet: already no access
+    assert process_due() == {'inactive': 1}
+    assert user.subscription_status == 'inactive'
+    assert user.next_transition_at is None
+    assert not user.is_subscribed()
+
+def test_trial_expiry_renews_locally_without_stripe(user):
+    lifecycle.start_trial(user)
+    db.session.commit()
+
+    clock.advance(days=lifecycle.trial_days)
+    assert process_due() == {'active': 1}
+    assert user.current_period_end == START + timedelta(days=lifecycle.trial_days + lifecycle.period_days)
+    assert user.is_subscribed()
+
+def test_grace_period_is_not_extended_by_repeated_failures(user, stripe_enabled):
+    lifecycle.activate(user)
+    lifecycle.payment_failed(user)
+    db.session.commit()
+    grace_end = START + timedelta(days=lifecycle.grace_days)
+    assert user.next_transition_at == grace_end
+
+    clock.advance(days=1)
+    lifecycle.payment_failed(user)
+    db.session.commit()
+    assert user.current_period_end == grace_end
+    assert user.next_transition_at == grace_end
+
+    clock.advance(days=lifecycle.grace_days - 1)
+    assert process_due() == {'inactive': 1}
+
+def test_cancel_at_period_end_keeps_access_until_period_end(user, stripe_enabled):
+    lifecycle.activate(user)
+    db.session.commit()
+    period_end = START + timedelta(days=lifecycle.period_days)
+
+    clock.advance(days=10)
+    assert lifecycle.cancel(user) == period_end
+    db.session.commit()
+    assert user.subscription_status == 'active'
+    assert user.cancel_at_period_end
+    assert user.is_subscribed()
+
+    clock.advance(days=lifecycle.period_days - 10)
+    assert not user.is_subscribed()
+    assert process_due() == {'canceled': 1}
+    assert user.subscription_status == 'canceled'
+    assert not user.cancel_at_period_end
+    assert user.next_transition_at is None
+
+def test_cancel_without_a_current_period_ends_now(user):
+    user.subscription_status = 'active'
+    assert lifecycle.cancel(user) is None
+    assert user.subscription_status == 'canceled'
+    assert not user.is_subscribed()
+
+def test_sync_past_due_uses_grace_period_not_stripe_period_end(user, stripe_enabled):
+    lifecycle.activate(user)
+    db.session.commit()
+
+    # Stripe has already rolled current_period_end over to the next period
+    clock.advance(days=lifecycle.period_days)
+    rolled_over = clock.now() + timedelta(days=lifecycle.period_days)
+    lifecycle.sync(user, 'past_due', period_end=rolled_over)
+    db.session.commit()
+    grace_end = clock.now() + timedelta(days=lifecycle.grace_days)
+    assert user.subscription_status == 'past_due'
+    assert user.current_period_end == grace_end
+    assert user.next_transition_at == grace_end
+
+    # A repeated past_due sync keeps the original deadline
+    clock.advance(days=1)
+    lifecycle.sync(user, 'past_due', period_end=rolled_over)
+    db.session.commit()
+    assert user.next_transition_at == grace_end
+
+    clock.advance(days=lifecycle.grace_days - 1)
+    assert process_due() == {'inactive': 1}
+
+def test_sync_past_due_with_cancel_at_period_end_ends_canceled(user, stripe_enabled):
+    lifecycle.activate(user)
+    lifecycle.sync(user, 'past_due', period_end=START + timedelta(days=60), cancel_at_period_end=True)
+    db.session.commit()
+
+    clock.advance(days=lifecycle.grace_days)
+    assert process_due() == {'canceled': 1}
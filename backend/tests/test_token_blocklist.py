@@ -0,0 +1,26 @@
+import uuid
+from datetime import datetime, timedelta
+from models.models import RevokedToken, db
+from utils.token_blocklist import BloomFilter, token_blocklist
+
+def test_bloom_filter_counts_each_item_once():
+    bloom = BloomFilter(1000)
+    assert bloom.add('jti-1')
+    assert not bloom.add('jti-1')
+    assert bloom.count == 1
+    assert 'jti-1' in bloom
+
+def test_refresh_overlap_does_not_use_up_capacity(app):
+    now = datetime.utcnow()
+    jtis = [str(uuid.uuid4()) for _ in range(50)]
+    db.session.add_all([RevokedToken(jti=jti, revoked_at=now, expires_at=now + timedelta(hours=1)) for jti in jtis])
+    db.session.commit()
+
+    token_blocklist.refresh()
+    bloom = token_blocklist._bloom
+    for _ in range(5):
+        token_blocklist.refresh()  # Each re-reads the same recent rows
+
+    assert token_blocklist._bloom is bloom
+    assert bloom.count == len(jtis)
+    assert all(token_blocklist.token_in_blocklist({}, {'sub': 1, 'jti': jti}) for jti in jtis)
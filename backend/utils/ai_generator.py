@@ -1,6 +1,8 @@
 import openai
 import json
 from flask import current_app
+from utils.template_registry import template_registry
+from utils.usage_tracker import usage_tracker
 
 class AIProductGenerator:
     def __init__(self):
@@ -13,12 +15,27 @@ class AIProductGenerator:
             raise ValueError("OpenAI API key not configured")
         self.client = openai.OpenAI(api_key=api_key)
     
-    def generate_product(self, category, target_audience="resellers", style_preferences=None):
+    def generate_product(self, category, target_audience="resellers", style_preferences=None, user_id=None):
         """Generate a product using OpenAI GPT-4-mini"""
+        return self.generate_products(category, 1, target_audience, style_preferences, user_id)[0]
+    
+    def generate_products(self, category, count=1, target_audience="resellers", style_preferences=None, user_id=None):
+        """Generate up to `count` distinct products with a single completion.
+        
+        The instructions and system message are sent once for the whole batch, so the
+        prompt tokens are amortized across the listings. May return fewer than `count`
+        products if some listings in the response are invalid.
+        
+        Token usage is charged to `user_id`. Without a user (pre-generation) each
+        listing instead carries its share under ``usage``, to be charged on claim.
+        Listings that did not come from the model (templates after an API error, or
+        an unparseable reply) are marked ``fallback: True``.
+        """
         if not self.client:
             self.initialize_openai()
             
-        prompt = self._build_prompt(category, target_audience, style_preferences)
+        prompt = self._build_prompt(category, target_audience, style_preferences, count)
+        max_tokens = usage_tracker.max_tokens_for(category) * count
         
         try:
             response = self.client.chat.completions.create(
@@ -30,21 +47,75 @@ class AIProductGenerator:
                     },
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=800,
+                max_tokens=max_tokens,
                 temperature=0.7
             )
             
             content = response.choices[0].message.content
-            return self._parse_product_response(content)
+            if count == 1:
+                products = [self._parse_product_response(content)]
+            else:
+                products = self._parse_product_response(content, count)
             
         except Exception as e:
             current_app.logger.error(f"OpenAI API error: {str(e)}")
-            return self._get_fallback_product(category)
+            return [self._get_fallback_product(category)]
+        
+        # Outside the try: a usage bookkeeping error must not discard a paid completion
+        if response.usage:
+            truncated = response.choices[0].finish_reason == 'length'
+            if user_id is None:
+                usage_tracker.observe(category, response.usage.completion_tokens, max_tokens, truncated, count)
+                self._attach_usage(products, response.model, response.usage)
+            else:
+                usage_tracker.record(
+                    user_id,
+                    category,
+                    response.model,
+                    response.usage.prompt_tokens,
+                    response.usage.completion_tokens,
+                    max_tokens=max_tokens,
+                    truncated=truncated,
+                    listings=count
+                )
+        
+        return products
     
-    def _build_prompt(self, category, target_audience, style_preferences):
+    def _attach_usage(self, products, model, usage):
+        """Split a completion's tokens across the listings it produced"""
+        shares = len(products)
+        for index, product_data in enumerate(products):
+            product_data['usage'] = {
+                'model': model,
+                # The remainder goes to the first listing so the shares add up exactly
+                'prompt_tokens': usage.prompt_tokens // shares + (usage.prompt_tokens % shares if index == 0 else 0),
+                'completion_tokens': usage.completion_tokens // shares + (usage.completion_tokens % shares if index == 0 else 0)
+            }
+    
+    def _build_prompt(self, category, target_audience, style_preferences, count=1):
         """Build the prompt for product generation"""
+        if count == 1:
+            request_line = f"Generate a compelling product listing for the {category} category targeting {target_audience}."
+            subject = "The product should be:"
+        else:
+            request_line = f"Generate {count} distinct, compelling product listings for the {category} category targeting {target_audience}. Each listing must be a different product."
+            subject = "Each product should be:"
+        
+        listing_format = f"""{{
+    "title": "Product Title",
+    "description": "Detailed product description...",
+    "category": "{category}",
+    "suggested_price": 29.99,
+    "keywords": ["keyword1", "keyword2", "keyword3", "keyword4", "keyword5"]
+}}"""
+        
+        if count == 1:
+            response_format = f"Format the response as JSON with these fields:\n{listing_format}"
+        else:
+            response_format = f"Format the response as a JSON array of {count} objects, each with these fields:\n[\n{listing_format}\n]"
+        
         base_prompt = f"""
-Generate a compelling product listing for the {category} category targeting {target_audience}.
+{request_line}
 
 Requirements:
 - Create an attention-grabbing title (max 100 characters)
@@ -53,20 +124,13 @@ Requirements:
 - Include 5-8 relevant keywords for SEO
 - Focus on what makes this product appealing to resellers
 
-The product should be:
+{subject}
 - Trendy and in-demand
 - Suitable for online reselling
 - Appealing to the "baddie" aesthetic and lifestyle
 - High-margin potential
 
-Format the response as JSON with these fields:
-{{
-    "title": "Product Title",
-    "description": "Detailed product description...",
-    "category": "{category}",
-    "suggested_price": 29.99,
-    "keywords": ["keyword1", "keyword2", "keyword3", "keyword4", "keyword5"]
-}}
+{response_format}
 """
         
         if style_preferences:
@@ -74,8 +138,15 @@ Format the response as JSON with these fields:
             
         return base_prompt
     
-    def _parse_product_response(self, content):
-        """Parse the AI response into a structured product"""
+    def _parse_product_response(self, content, count=None):
+        """Parse the AI response into a structured product.
+        
+        With `count`, the response is expected to be a JSON array and a list of the
+        valid, distinct listings is returned instead.
+        """
+        if count is not None:
+            return self._parse_product_list(content, count)
+        
         try:
             # Try to extract JSON from the response
             start_idx = content.find('{')
@@ -83,13 +154,7 @@ Format the response as JSON with these fields:
             if start_idx != -1 and end_idx != 0:
                 json_str = content[start_idx:end_idx]
                 product_data = json.loads(json_str)
-                
-                # Validate required fields
-                required_fields = ['title', 'description', 'category', 'suggested_price', 'keywords']
-                for field in required_fields:
-                    if field not in product_data:
-                        raise ValueError(f"Missing required field: {field}")
-                
+                self._validate_product(product_data)
                 return product_data
             else:
                 raise ValueError("No JSON found in response")
@@ -99,6 +164,65 @@ Format the response as JSON with these fields:
             # Return a structured version of the raw content
             return self._fallback_parse(content)
     
+    def _parse_product_list(self, content, count):
+        """Parse a JSON array of listings, dropping invalid and repeated ones"""
+        try:
+            items = self._load_json(content)
+        except (json.JSONDecodeError, ValueError) as e:
+            current_app.logger.warning(f"Failed to parse AI response: {str(e)}")
+            return [self._fallback_parse(content)]
+        if isinstance(items, dict):
+            items = [items]  # The model answered with a single listing
+        elif not isinstance(items, list):
+            current_app.logger.warning("Failed to parse AI response: not a JSON array or object")
+            return [self._fallback_parse(content)]
+        
+        products = []
+        seen_titles = set()
+        for item in items[:count]:
+            try:
+                self._validate_product(item)
+            except ValueError as e:
+                current_app.logger.warning(f"Skipping invalid listing in AI response: {str(e)}")
+                continue
+            title_key = str(item['title']).strip().lower()
+            if title_key in seen_titles:
+                continue
+            seen_titles.add(title_key)
+            products.append(item)
+        
+        return products or [self._fallback_parse(content)]
+    
+    def _load_json(self, content):
+        """The JSON value in a response: the whole text, else its outermost array or object"""
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            pass
+        
+        # Surrounded by prose or code fences; the bracket that opens first is the outermost
+        spans = []
+        for open_char, close_char in (('[', ']'), ('{', '}')):
+            start_idx = content.find(open_char)
+            end_idx = content.rfind(close_char) + 1
+            if start_idx != -1 and end_idx > start_idx:
+                spans.append((start_idx, end_idx))
+        for start_idx, end_idx in sorted(spans):
+            try:
+                return json.loads(content[start_idx:end_idx])
+            except json.JSONDecodeError:
+                continue
+        raise ValueError("No JSON found in response")
+    
+    def _validate_product(self, product_data):
+        """Raise ValueError if a parsed listing is missing required fields"""
+        if not isinstance(product_data, dict):
+            raise ValueError("Listing is not a JSON object")
+        required_fields = ['title', 'description', 'category', 'suggested_price', 'keywords']
+        for field in required_fields:
+            if field not in product_data:
+                raise ValueError(f"Missing required field: {field}")
+    
     def _fallback_parse(self, content):
         """Fallback parsing if JSON extraction fails"""
         lines = content.strip().split('\n')
@@ -107,26 +231,12 @@ Format the response as JSON with these fields:
             "description": content[:400] if len(content) > 400 else content,
             "category": "Fashion",
             "suggested_price": 24.99,
-            "keywords": ["trendy", "fashion", "style", "baddie", "aesthetic"]
+            "keywords": ["trendy", "fashion", "style", "baddie", "aesthetic"],
+            "fallback": True
         }
     
     def _get_fallback_product(self, category):
         """Return a fallback product if AI generation fails"""
-        fallback_products = {
-            "fashion": {
-                "title": "Trendy Baddie Essential Collection",
-                "description": "Elevate your style with this must-have collection perfect for the modern baddie lifestyle. Features premium materials, attention-grabbing design, and versatile styling options. Ideal for resellers looking to offer high-demand fashion pieces that customers love.",
-                "category": category,
-                "suggested_price": 29.99,
-                "keywords": ["fashion", "trendy", "baddie", "style", "collection", "premium"]
-            },
-            "accessories": {
-                "title": "Statement Baddie Accessories Set",
-                "description": "Complete your baddie look with these eye-catching accessories. High-quality materials meet contemporary design in this collection that's perfect for resellers. Each piece is designed to complement the modern woman's lifestyle and aesthetic preferences.",
-                "category": category,
-                "suggested_price": 19.99,
-                "keywords": ["accessories", "statement", "baddie", "jewelry", "trendy", "modern"]
-            }
-        }
-        
-        return fallback_products.get(category.lower(), fallback_products["fashion"])
\ No newline at end of file
+        product_data = template_registry.get_template(category)
+        product_data['fallback'] = True
+        return product_data
\ No newline at end of file
@@ -0,0 +1,218 @@
+import json
+import time
+import zlib
+from datetime import datetime, timedelta
+import click
+from flask.cli import AppGroup
+from models.models import Product, ProductArchive, db
+from utils.dedup import duplicate_index
+from utils.similarity import similarity_index
+
+class ProductArchiver:
+    """Cold storage for products nobody has touched in a while.
+
+    The mover copies products whose ``updated_at`` is older than ``archive_after_days``
+    into ``product_archive`` in keyset-paginated batches, with description, keywords and
+    prompt compressed into one zlib blob, and deletes them from ``product`` along with
+    their dedup and similarity index rows. Each batch is its own transaction, so an
+    interrupted run simply resumes on the next one. Archived products are decompressed
+    on read and moved back to ``product`` when they are edited.
+    """
+
+    def __init__(self):
+        self.archive_after_days = 180
+        self.batch_size = 1000
+        self.compression_level = 9
+
+    def init_app(self, app):
+        """Configure the archiver from the Flask app config"""
+        self.archive_after_days = app.config.get('ARCHIVE_AFTER_DAYS', self.archive_after_days)
+        self.batch_size = app.config.get('ARCHIVE_BATCH_SIZE', self.batch_size)
+        self.compression_level = app.config.get('ARCHIVE_COMPRESSION_LEVEL', self.compression_level)
+        app.extensions['product_archiver'] = self
+        app.cli.add_command(archive_cli)
+
+    def archive(self, older_than_days=None, max_batches=None):
+        """Move products untouched for `older_than_days` into the archive; returns the number moved"""
+        days = self.archive_after_days if older_than_days is None else older_than_days
+        cutoff = datetime.utcnow() - timedelta(days=days)
+
+        self._check_ids_not_reused()
+
+        moved = 0
+        last_id = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            rows = db.session.execute(
+                db.select(Product.__table__).where(
+                    Product.id > last_id,
+                    Product.updated_at < cutoff
+                ).order_by(Product.id).limit(self.batch_size).with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                break
+
+            last_id = rows[-1].id
+            ids = [row.id for row in rows]
+            now = datetime.utcnow()
+            db.session.execute(db.insert(ProductArchive), [self._archive_row(row, now) for row in rows])
+            duplicate_index.remove_products(ids)
+            similarity_index.remove_products(ids)
+            Product.query.filter(Product.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+            moved += len(ids)
+            batches += 1
+
+        return moved
+
+    def get(self, product_id, user_id):
+        """An archived product as a dict shaped like Product.to_dict(), or None"""
+        archived = ProductArchive.query.filter_by(id=product_id, user_id=user_id).first()
+        return self.to_dict(archived) if archived else None
+
+    def restore(self, product_id, user_id):
+        """Move an archived product back into the product table (flushed with the caller's session)"""
+        archived = ProductArchive.query.filter_by(id=product_id, user_id=user_id).first()
+        if not archived:
+            return None
+
+        payload = self._decompress(archived.payload)
+        product = Product(
+            id=archived.id,
+            user_id=archived.user_id,
+            title=archived.title,
+            description=payload['description'],
+            category=archived.category,
+            price=archived.price,
+            keywords=payload['keywords'],
+            prompt_used=payload['prompt_used'],
+            ai_model=archived.ai_model,
+            created_at=archived.created_at,
+            updated_at=archived.updated_at
+        )
+        db.session.delete(archived)
+        db.session.add(product)
+        db.session.flush()
+        duplicate_index.index_product(product)
+        similarity_index.index_product(product)
+        return product
+
+    def delete(self, product_id, user_id):
+        """Delete an archived product; returns whether one was found"""
+        return ProductArchive.query.filter_by(
+            id=product_id, user_id=user_id
+        ).delete(synchronize_session=False) > 0
+
+    def listing(self, user_id, category=None, page=1, per_page=10):
+        """One page of hot and archived products, newest first; returns (dicts, total)"""
+        hot = db.select(Product.id, Product.created_at, db.literal(False).label('archived')).where(
+            Product.user_id == user_id
+        )
+        cold = db.select(ProductArchive.id, ProductArchive.created_at, db.literal(True).label('archived')).where(
+            ProductArchive.user_id == user_id
+        )
+        if category:
+            hot = hot.where(Product.category == category)
+            cold = cold.where(ProductArchive.category == category)
+        combined = db.union_all(hot, cold).subquery()
+
+        total = db.session.execute(db.select(db.func.count()).select_from(combined)).scalar()
+        rows = db.session.execute(
+            db.select(combined).order_by(combined.c.created_at.desc()).limit(max(per_page, 0)).offset(max(page - 1, 0) * per_page)
+        ).all()
+
+        hot_ids = [row.id for row in rows if not row.archived]
+        cold_ids = [row.id for row in rows if row.archived]
+        products = {product.id: product.to_dict() for product in Product.query.filter(Product.id.in_(hot_ids))} if hot_ids else {}
+        archived = {
+            product.id: self.to_dict(product)
+            for product in ProductArchive.query.filter(ProductArchive.id.in_(cold_ids))
+        } if cold_ids else {}
+
+        items = [(archived if row.archived else products).get(row.id) for row in rows]
+        return [item for item in items if item is not None], total
+
+    def to_dict(self, archived):
+        payload = self._decompress(archived.payload)
+        return {
+            'id': archived.id,
+            'title': archived.title,
+            'description': payload['description'],
+            'category': archived.category,
+            'price': archived.price,
+            'keywords': payload['keywords'],
+            'created_at': archived.created_at.isoformat(),
+            'updated_at': archived.updated_at.isoformat(),
+            'archived': True,
+            'archived_at': archived.archived_at.isoformat()
+        }
+
+    def stats(self):
+        """Row count and compressed payload size of the archive"""
+        count, payload_bytes = db.session.query(
+            db.func.count(ProductArchive.id),
+            db.func.coalesce(db.func.sum(db.func.length(ProductArchive.payload)), 0)
+        ).one()
+        return {'archived_products': count, 'payload_bytes': int(payload_bytes)}
+
+    def _archive_row(self, row, now):
+        payload = json.dumps({
+            'description': row.description,
+            'keywords': row.keywords,
+            'prompt_used': row.prompt_used
+        }, separators=(',', ':')).encode('utf-8')
+        return {
+            'id': row.id,
+            'user_id': row.user_id,
+            'title': row.title,
+            'category': row.category,
+            'price': row.price,
+            'ai_model': row.ai_model,
+            'payload': zlib.compress(payload, self.compression_level),
+            'created_at': row.created_at or now,
+            'updated_at': row.updated_at or now,
+            'archived_at': now
+        }
+
+    def _check_ids_not_reused(self):
+        """Refuse to archive into a SQLite product table that can hand archived ids out again"""
+        if db.engine.dialect.name != 'sqlite':
+            return  # Sequences never go backwards
+        ddl = db.session.execute(
+            db.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': Product.__tablename__}
+        ).scalar()
+        if ddl and 'AUTOINCREMENT' not in ddl.upper():
+            # Without AUTOINCREMENT SQLite reuses max(id) + 1, which may be an archived id
+            raise RuntimeError(
+                "The product table was created without AUTOINCREMENT; recreate it "
+                "(e.g. flask transfer copy into a fresh database) before archiving"
+            )
+
+    @staticmethod
+    def _decompress(payload):
+        return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+product_archiver = ProductArchiver()
+
+archive_cli = AppGroup('archive', help='Move old products to cold storage.')
+
+@archive_cli.command('run')
+@click.option('--days', type=int, default=None, help='Archive products untouched for this many days.')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches.')
+def run_command(days, max_batches):
+    """Archive products that have not been updated recently"""
+    started = time.monotonic()
+    try:
+        moved = product_archiver.archive(older_than_days=days, max_batches=max_batches)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    elapsed = time.monotonic() - started
+    print(f"Archived {moved} products in {elapsed:.1f}s ({moved / elapsed if elapsed else 0:.0f} rows/s)")
+
+@archive_cli.command('stats')
+def stats_command():
+    """Show archive size"""
+    stats = product_archiver.stats()
+    print(f"{stats['archived_products']} archived products, {stats['payload_bytes']} compressed payload bytes")
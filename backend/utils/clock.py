@@ -0,0 +1,30 @@
+import threading
+from datetime import datetime, timedelta
+
+class Clock:
+    """Source of the current (naive UTC) time that tests and scripts can freeze and advance"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frozen = None
+
+    def now(self):
+        frozen = self._frozen
+        return frozen if frozen is not None else datetime.utcnow()
+
+    def freeze(self, at=None):
+        """Stop the clock at `at` (default: the current time)"""
+        with self._lock:
+            self._frozen = at or datetime.utcnow()
+
+    def advance(self, **kwargs):
+        """Move the clock forward by a timedelta(**kwargs), freezing it if it was running"""
+        with self._lock:
+            self._frozen = (self._frozen or datetime.utcnow()) + timedelta(**kwargs)
+
+    def reset(self):
+        """Follow the system time again"""
+        with self._lock:
+            self._frozen = None
+
+clock = Clock()
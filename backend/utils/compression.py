@@ -0,0 +1,66 @@
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip only without it
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+class ResponseCompressor:
+    """Compresses textual responses above ``min_size`` bytes.
+
+    The encoding is negotiated from ``Accept-Encoding``: brotli when the client accepts
+    it at least as much as gzip and the ``brotli`` package is installed, otherwise gzip.
+    Small bodies are sent as-is since compressing them costs more CPU than it saves on
+    the wire.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 4
+
+    def init_app(self, app):
+        """Configure compression from the Flask app config and hook it into responses"""
+        self.enabled = app.config.get('COMPRESS_ENABLED', self.enabled)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', self.gzip_level)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', self.brotli_quality)
+        app.extensions['response_compressor'] = self
+        app.after_request(self.compress_response)
+
+    def choose_encoding(self, accept_encodings):
+        """Best supported encoding for an Accept-Encoding header, or None"""
+        gzip_quality = accept_encodings.quality('gzip')
+        if brotli is not None and accept_encodings.quality('br') and accept_encodings.quality('br') >= gzip_quality:
+            return 'br'
+        return 'gzip' if gzip_quality else None
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def compress_response(self, response):
+        if not self.enabled or response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES or not 200 <= response.status_code < 300:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        response.set_data(self.compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+response_compressor = ResponseCompressor()
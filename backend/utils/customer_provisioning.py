@@ -0,0 +1,193 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import AppGroup
+import click
+from models.models import StripeCustomerOutbox, User, db
+
+def customer_idempotency_key(user_id):
+    """Stripe idempotency key for creating the customer of a user"""
+    return f"create-customer-user-{user_id}"
+
+class CustomerProvisioner:
+    """Creates Stripe customers outside the signup request.
+
+    Signup only writes an outbox row in the same transaction as the user. A worker
+    (``flask stripe provision-customers`` or the optional in-process thread) leases due
+    rows in batches and calls Stripe with an idempotency key derived from the user id,
+    so retries and racing workers never create duplicate customers. Checkout creates
+    the customer on demand if the worker has not got to it yet.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.batch_size = 50
+        self.max_attempts = 8
+        self.lease_seconds = 60
+        self.poll_interval = 5
+        self._stripe_service = None
+        self._worker = None
+
+    def init_app(self, app):
+        """Configure the provisioner from the Flask app config"""
+        self.app = app
+        self.batch_size = app.config.get('STRIPE_PROVISIONING_BATCH_SIZE', self.batch_size)
+        self.max_attempts = app.config.get('STRIPE_PROVISIONING_MAX_ATTEMPTS', self.max_attempts)
+        self.poll_interval = app.config.get('STRIPE_PROVISIONING_INTERVAL', self.poll_interval)
+        app.extensions['customer_provisioner'] = self
+        app.cli.add_command(stripe_cli)
+
+        if app.config.get('STRIPE_PROVISIONING_WORKER') and self._worker is None:
+            self._worker = threading.Thread(target=self._run_forever, name='stripe-provisioning', daemon=True)
+            self._worker.start()
+
+    def stripe_enabled(self):
+        return bool(current_app.config.get('STRIPE_SECRET_KEY'))
+
+    def enqueue(self, user):
+        """Queue customer creation for a new user (flushed with the caller's session)"""
+        if not self.stripe_enabled():
+            # Demo mode: no Stripe account, nothing to call
+            user.stripe_customer_id = f"cus_demo_{user.id}"
+            return
+
+        db.session.add(StripeCustomerOutbox(
+            user_id=user.id,
+            idempotency_key=customer_idempotency_key(user.id)
+        ))
+
+    def ensure_customer(self, user):
+        """Return the user's Stripe customer ID, creating the customer now if needed.
+
+        The caller commits the session.
+        """
+        if user.stripe_customer_id:
+            return user.stripe_customer_id
+
+        if not self.stripe_enabled():
+            user.stripe_customer_id = f"cus_demo_{user.id}"
+            return user.stripe_customer_id
+
+        customer = self._get_stripe_service().create_customer(
+            user.email, user.id, idempotency_key=customer_idempotency_key(user.id)
+        )
+        user.stripe_customer_id = customer.id
+        StripeCustomerOutbox.query.filter_by(user_id=user.id).update({
+            'status': 'done',
+            'processed_at': datetime.utcnow(),
+            'locked_until': None
+        }, synchronize_session=False)
+        return user.stripe_customer_id
+
+    def process_batch(self):
+        """Provision one batch of due outbox rows; returns (succeeded, failed)"""
+        ids = self._lease_due_entries()
+        if not ids:
+            return 0, 0
+
+        # Read everything up front and end the transaction: nothing may hold a database
+        # lock (on SQLite, the write lock signups need) while Stripe is being called
+        entries = db.session.execute(
+            db.select(
+                StripeCustomerOutbox.id,
+                StripeCustomerOutbox.idempotency_key,
+                StripeCustomerOutbox.attempts,
+                User.id.label('user_id'),
+                User.email,
+                User.stripe_customer_id
+            ).join(User, User.id == StripeCustomerOutbox.user_id).where(StripeCustomerOutbox.id.in_(ids))
+        ).all()
+        db.session.commit()
+
+        now = datetime.utcnow()
+        done, retries, customers = [], [], []
+        for entry in entries:
+            try:
+                if not entry.stripe_customer_id:
+                    customer = self._get_stripe_service().create_customer(
+                        entry.email, entry.user_id, idempotency_key=entry.idempotency_key
+                    )
+                    customers.append({'id': entry.user_id, 'stripe_customer_id': customer.id})
+                done.append({'id': entry.id, 'status': 'done', 'processed_at': now, 'locked_until': None})
+            except Exception as e:
+                attempts = entry.attempts + 1
+                retries.append({
+                    'id': entry.id,
+                    'status': 'failed' if attempts >= self.max_attempts else 'pending',
+                    'attempts': attempts,
+                    'last_error': str(e),
+                    'next_attempt_at': now + timedelta(seconds=min(2 ** attempts * 5, 3600)),
+                    'locked_until': None
+                })
+
+        # One short write transaction for the whole batch
+        if customers:
+            db.session.execute(db.update(User), customers)
+        for updates in (done, retries):
+            if updates:
+                db.session.execute(db.update(StripeCustomerOutbox), updates)
+        db.session.commit()
+        return len(done), len(retries)
+
+    def process_all(self):
+        """Drain every due outbox row; returns (succeeded, failed)"""
+        totals = [0, 0]
+        while True:
+            succeeded, failed = self.process_batch()
+            if not succeeded and not failed:
+                return tuple(totals)
+            totals[0] += succeeded
+            totals[1] += failed
+
+    def _lease_due_entries(self):
+        """Lease a batch of due rows so concurrent workers pick disjoint batches"""
+        now = datetime.utcnow()
+        due = db.select(StripeCustomerOutbox.id).where(
+            StripeCustomerOutbox.status == 'pending',
+            StripeCustomerOutbox.next_attempt_at <= now,
+            db.or_(StripeCustomerOutbox.locked_until.is_(None), StripeCustomerOutbox.locked_until < now)
+        ).order_by(StripeCustomerOutbox.id).limit(self.batch_size).with_for_update(skip_locked=True)
+
+        ids = db.session.execute(
+            db.update(StripeCustomerOutbox).where(
+                StripeCustomerOutbox.id.in_(due),
+                db.or_(StripeCustomerOutbox.locked_until.is_(None), StripeCustomerOutbox.locked_until < now)
+            ).values(
+                locked_until=now + timedelta(seconds=self.lease_seconds)
+            ).returning(StripeCustomerOutbox.id)
+        ).scalars().all()
+        db.session.commit()
+        return ids
+
+    def _get_stripe_service(self):
+        if self._stripe_service is None:
+            from utils.stripe_service import StripeService
+            self._stripe_service = StripeService()
+        return self._stripe_service
+
+    def _run_forever(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    if self.stripe_enabled():
+                        self.process_all()
+            except Exception as e:
+                self.app.logger.error(f"Stripe provisioning worker error: {str(e)}")
+            time.sleep(self.poll_interval)
+
+customer_provisioner = CustomerProvisioner()
+
+stripe_cli = AppGroup('stripe', help='Stripe background jobs.')
+
+@stripe_cli.command('provision-customers')
+@click.option('--watch', is_flag=True, help='Keep polling for new signups.')
+def provision_customers_command(watch):
+    """Create Stripe customers for queued signups"""
+    while True:
+        succeeded, failed = customer_provisioner.process_all()
+        if succeeded or failed or not watch:
+            print(f"Provisioned {succeeded} customers, {failed} failed")
+        if not watch:
+            return
+        time.sleep(customer_provisioner.poll_interval)
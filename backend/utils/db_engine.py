@@ -0,0 +1,49 @@
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND_KEY = 'replica'
+READ_ONLY_METHODS = ('GET', 'HEAD')
+
+class RoutingSession(Session):
+    """Session that sends reads from GET requests to the read replica, if configured"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._should_use_replica():
+            return self._db.engines[REPLICA_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _should_use_replica(self):
+        """Only route when the request is read-only and nothing is pending a flush"""
+        if REPLICA_BIND_KEY not in self._db.engines:
+            return False
+        if not has_request_context() or request.method not in READ_ONLY_METHODS:
+            return False
+        return not (self._flushing or self.new or self.dirty or self.deleted)
+
+def configure_engines(app, db):
+    """Attach per-connection tuning to every SQLite engine of the app"""
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _sqlite_pragma_listener(app.config))
+
+def _sqlite_pragma_listener(config):
+    """Build a connect listener applying the configured SQLite pragmas"""
+    pragmas = [
+        # busy_timeout goes first so switching the journal mode waits on locks too
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA journal_mode={config.get('SQLITE_JOURNAL_MODE', 'WAL')}",
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE', 0))}"
+    ]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return set_pragmas
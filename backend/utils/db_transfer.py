@@ -0,0 +1,309 @@
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import create_engine, inspect
+from config.config import build_engine_options
+from models.models import db
+
+# Lives only in the target database; each chunk updates it in the same transaction
+# as its rows, so a rerun resumes exactly after the last committed chunk
+checkpoint_metadata = db.MetaData()
+transfer_checkpoint = db.Table(
+    'db_transfer_checkpoint', checkpoint_metadata,
+    db.Column('table_name', db.String(100), primary_key=True),
+    db.Column('last_id', db.BigInteger, nullable=False),
+    db.Column('rows_copied', db.BigInteger, nullable=False),
+    db.Column('updated_at', db.DateTime, nullable=False)
+)
+
+# Never app data: transfer bookkeeping, and Alembic's revision (stamp the target instead)
+UNCHECKED_TABLES = {transfer_checkpoint.name, 'alembic_version'}
+
+class DatabaseTransfer:
+    """Copies tables between databases in primary-key order, e.g. SQLite to PostgreSQL.
+
+    Each table is streamed in keyset-paginated chunks and loaded with COPY on
+    psycopg 3 targets, or batched multi-row INSERTs otherwise, keeping the original
+    ids. By default every table of the app's models is copied. Tables without foreign
+    keys between them are copied in parallel; dependent tables wait for their parents.
+    After a table is loaded its PostgreSQL sequence is moved past the highest id.
+    ``verify`` compares row counts and a SHA-256 over the ordered rows on both sides,
+    and ``uncopied`` lists source tables with rows that the transfer left out.
+    """
+
+    def __init__(self, source_url, target_url, tables=None, chunk_size=5000, workers=3, log=None):
+        self.source = create_engine(source_url, **build_engine_options(source_url))
+        self.target = create_engine(target_url, **build_engine_options(target_url))
+        self.tables = tables or list(db.metadata.sorted_tables)
+        self.chunk_size = chunk_size
+        # SQLite takes one writer at a time, so parallel loads would only queue on its lock
+        self.workers = 1 if self.target.dialect.name == 'sqlite' else workers
+        self.log = log or (lambda message: None)
+
+    def copy(self, restart=False):
+        """Copy every table, resuming from checkpoints; returns {table: (rows, seconds)}"""
+        db.metadata.create_all(self.target, tables=self.tables)
+        checkpoint_metadata.create_all(self.target)
+        if restart:
+            self._reset()
+
+        results = {}
+        for wave in self._waves():
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(wave))) as pool:
+                for table, result in zip(wave, pool.map(self._copy_table, wave)):
+                    results[table.name] = result
+        return results
+
+    def verify(self):
+        """Compare row counts and checksums; returns {table: (source, target)} fingerprints,
+        with (0, None) for a table missing from the target"""
+        present = set(inspect(self.target).get_table_names())
+
+        def fingerprints(table):
+            target = self._fingerprint(self.target, table) if table.name in present else (0, None)
+            return self._fingerprint(self.source, table), target
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(self.tables)))) as pool:
+            return {table.name: result for table, result in zip(self.tables, pool.map(fingerprints, self.tables))}
+
+    def uncopied(self):
+        """{table: row count} for source tables with rows that are not part of this transfer"""
+        copied = {table.name for table in self.tables} | UNCHECKED_TABLES
+        skipped = {}
+        with self.source.connect() as connection:
+            for name in inspect(connection).get_table_names():
+                if name in copied:
+                    continue
+                rows = connection.execute(db.select(db.func.count()).select_from(db.table(name))).scalar()
+                if rows:
+                    skipped[name] = rows
+        return skipped
+
+    def _copy_table(self, table):
+        pk = self._primary_key(table)
+        last_id, copied = self._checkpoint(table)
+        resumed_from = copied
+        started = time.monotonic()
+        logged_at = started
+
+        with self.source.connect() as source:
+            while True:
+                rows = source.execute(
+                    db.select(table).where(pk > last_id).order_by(pk).limit(self.chunk_size)
+                ).all()
+                if not rows:
+                    break
+
+                last_id = rows[-1]._mapping[pk.name]
+                copied += len(rows)
+                with self.target.begin() as target:
+                    self._load(target, table, rows)
+                    self._save_checkpoint(target, table.name, last_id, copied)
+
+                if time.monotonic() - logged_at >= 5:
+                    logged_at = time.monotonic()
+                    self.log(f"  {table.name}: {copied} rows copied so far")
+
+        self._reset_sequence(table, pk)
+        return copied - resumed_from, time.monotonic() - started
+
+    def _load(self, connection, table, rows):
+        if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg':
+            quote = connection.dialect.identifier_preparer.quote
+            columns = ', '.join(quote(column.name) for column in table.columns)
+            cursor = connection.connection.cursor()
+            try:
+                with cursor.copy(f"COPY {quote(table.name)} ({columns}) FROM STDIN") as copy:
+                    for row in rows:
+                        copy.write_row(tuple(row))
+            finally:
+                cursor.close()
+        else:
+            connection.execute(table.insert(), [dict(row._mapping) for row in rows])
+
+    def _reset_sequence(self, table, pk):
+        if self.target.dialect.name != 'postgresql':
+            return
+        quote = self.target.dialect.identifier_preparer.quote
+        with self.target.begin() as connection:
+            connection.execute(db.text(
+                f"SELECT setval(pg_get_serial_sequence(:table, :column), "
+                f"COALESCE(MAX({quote(pk.name)}), 1), MAX({quote(pk.name)}) IS NOT NULL) FROM {quote(table.name)}"
+            ), {'table': quote(table.name), 'column': pk.name})
+
+    def _checkpoint(self, table):
+        """(last copied id, rows copied) to resume from; refuses to mix into existing data"""
+        with self.target.connect() as connection:
+            row = connection.execute(
+                db.select(transfer_checkpoint.c.last_id, transfer_checkpoint.c.rows_copied).where(
+                    transfer_checkpoint.c.table_name == table.name
+                )
+            ).first()
+            if row:
+                return row.last_id, row.rows_copied
+            if connection.execute(db.select(db.literal(1)).select_from(table).limit(1)).first():
+                raise ValueError(f"Target table {table.name} already has rows; use --restart to copy it again")
+        return 0, 0
+
+    def _save_checkpoint(self, connection, table_name, last_id, copied):
+        values = {'last_id': last_id, 'rows_copied': copied, 'updated_at': datetime.utcnow()}
+        updated = connection.execute(
+            transfer_checkpoint.update().where(transfer_checkpoint.c.table_name == table_name).values(**values)
+        ).rowcount
+        if not updated:
+            connection.execute(transfer_checkpoint.insert().values(table_name=table_name, **values))
+
+    def _reset(self):
+        """Forget checkpoints and delete copied rows, children before parents"""
+        with self.target.begin() as connection:
+            for wave in reversed(self._waves()):
+                for table in wave:
+                    connection.execute(table.delete())
+            connection.execute(transfer_checkpoint.delete().where(
+                transfer_checkpoint.c.table_name.in_([table.name for table in self.tables])
+            ))
+
+    def _waves(self):
+        """Groups of tables that can be copied in parallel, parents before children"""
+        remaining = list(self.tables)
+        done = set()
+        waves = []
+        while remaining:
+            wave = [
+                table for table in remaining
+                if all(
+                    fk.column.table in done or fk.column.table is table or fk.column.table not in remaining
+                    for fk in table.foreign_keys
+                )
+            ] or remaining  # Foreign key cycle: copy the rest together
+            waves.append(wave)
+            done.update(wave)
+            remaining = [table for table in remaining if table not in done]
+        return waves
+
+    def _fingerprint(self, engine, table):
+        """(row count, SHA-256 of the rows in primary-key order)"""
+        pk = self._primary_key(table)
+        digest = hashlib.sha256()
+        count = 0
+        last_id = None
+        with engine.connect() as connection:
+            while True:
+                query = db.select(table).order_by(pk).limit(self.chunk_size)
+                if last_id is not None:
+                    query = query.where(pk > last_id)
+                rows = connection.execute(query).all()
+                if not rows:
+                    return count, digest.hexdigest()
+                for row in rows:
+                    digest.update(repr(tuple(_normalize(value) for value in row)).encode('utf-8'))
+                count += len(rows)
+                last_id = rows[-1]._mapping[pk.name]
+
+    @staticmethod
+    def _primary_key(table):
+        columns = list(table.primary_key.columns)
+        if len(columns) != 1:
+            raise ValueError(f"Table {table.name} needs a single-column primary key to be copied")
+        return columns[0]
+
+def _normalize(value):
+    """Driver-independent form of a column value for checksums"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return value
+
+def resolve_tables(names):
+    """Tables for --table options (table or model names), defaulting to every model table"""
+    if not names:
+        return None
+    tables = {table.name: table for table in db.metadata.sorted_tables}
+    models = {mapper.class_.__name__.lower(): mapper.local_table for mapper in db.Model.registry.mappers}
+    resolved = []
+    for name in names:
+        table = tables.get(name, models.get(name.lower()))
+        if table is None:
+            raise click.BadParameter(f"Unknown table {name}", param_hint='--table')
+        resolved.append(table)
+    return resolved
+
+transfer_cli = AppGroup('transfer', help='Copy the database to another server.')
+
+@transfer_cli.command('copy')
+@click.argument('target_url')
+@click.option('--source', 'source_url', default=None, help='Source database URL (default: the app database).')
+@click.option('--table', 'table_names', multiple=True, help='Table to copy; repeatable (default: every table).')
+@click.option('--chunk-size', type=int, default=None, help='Rows read and loaded per transaction (default: TRANSFER_CHUNK_SIZE).')
+@click.option('--workers', type=int, default=None, help='Tables copied in parallel (default: TRANSFER_WORKERS).')
+@click.option('--restart', is_flag=True, help='Delete previously copied rows and checkpoints first.')
+@click.option('--no-verify', is_flag=True, help='Skip the count and checksum comparison.')
+def copy_command(target_url, source_url, table_names, chunk_size, workers, restart, no_verify):
+    """Copy tables to TARGET_URL keeping ids, resuming an interrupted copy"""
+    transfer = DatabaseTransfer(
+        source_url or current_app.config['SQLALCHEMY_DATABASE_URI'], target_url,
+        tables=resolve_tables(table_names),
+        chunk_size=chunk_size or current_app.config.get('TRANSFER_CHUNK_SIZE', 5000),
+        workers=workers or current_app.config.get('TRANSFER_WORKERS', 3),
+        log=print
+    )
+    print(f"Copying {transfer.source.url.render_as_string(hide_password=True)} -> "
+          f"{transfer.target.url.render_as_string(hide_password=True)}")
+
+    started = time.monotonic()
+    try:
+        results = transfer.copy(restart=restart)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    elapsed = time.monotonic() - started
+
+    for name, (rows, seconds) in results.items():
+        print(f"  {name}: {rows} rows in {seconds:.1f}s ({rows / seconds if seconds else 0:.0f} rows/s)")
+    total = sum(rows for rows, _ in results.values())
+    print(f"Copied {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)")
+
+    if not no_verify:
+        _report_verification(transfer, selected=bool(table_names))
+
+@transfer_cli.command('verify')
+@click.argument('target_url')
+@click.option('--source', 'source_url', default=None, help='Source database URL (default: the app database).')
+@click.option('--table', 'table_names', multiple=True, help='Table to check; repeatable (default: every table).')
+def verify_command(target_url, source_url, table_names):
+    """Compare row counts and checksums with TARGET_URL"""
+    _report_verification(DatabaseTransfer(
+        source_url or current_app.config['SQLALCHEMY_DATABASE_URI'], target_url,
+        tables=resolve_tables(table_names),
+        chunk_size=current_app.config.get('TRANSFER_CHUNK_SIZE', 5000),
+        workers=current_app.config.get('TRANSFER_WORKERS', 3)
+    ), selected=bool(table_names))
+
+def _report_verification(transfer, selected=False):
+    mismatched = []
+    for name, ((source_rows, source_sum), (target_rows, target_sum)) in transfer.verify().items():
+        match = source_rows == target_rows and source_sum == target_sum
+        if target_sum is None:
+            print(f"  {name}: source {source_rows} rows, MISSING from the target")
+        else:
+            print(f"  {name}: source {source_rows} rows, target {target_rows} rows, "
+                  f"checksum {'match' if match else 'MISMATCH'} ({source_sum[:12]})")
+        if not match:
+            mismatched.append(name)
+
+    skipped = transfer.uncopied()
+    for name, rows in skipped.items():
+        print(f"  {name}: source {rows} rows, NOT COPIED")
+
+    if mismatched:
+        raise click.ClickException(f"Verification failed for {', '.join(mismatched)}")
+    if skipped and not selected:
+        raise click.ClickException(f"Source tables with rows were not copied: {', '.join(skipped)}")
+    if skipped:
+        print(f"Verification passed for the selected tables; {len(skipped)} other source tables have rows")
+    else:
+        print("Verification passed")
@@ -0,0 +1,184 @@
+import hashlib
+import random
+import re
+from array import array
+from models.models import ProductLSHBucket, ProductSignature, db
+
+MERSENNE_PRIME = (1 << 61) - 1
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def _unpack(blob):
+    values = array('Q')
+    values.frombytes(blob)
+    return values.tolist()
+
+def shingles(text, size=3):
+    """Word n-grams of the normalized text"""
+    words = WORD_PATTERN.findall((text or '').lower())
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+class DuplicateIndex:
+    """Near-duplicate detection for products using MinHash signatures and LSH banding.
+
+    Each product's title and description are reduced to ``num_perm`` minhashes, split
+    into ``bands`` bands, and every band is stored as a bucket row. Candidates are the
+    products sharing at least one bucket with the new text (one indexed ``IN`` query),
+    and only those are compared, so lookups never scan the user's whole catalog.
+    """
+
+    def __init__(self, num_perm=64, bands=16, threshold=0.8, seed=1):
+        self.threshold = threshold
+        self.configure(num_perm, bands, seed)
+
+    def init_app(self, app):
+        """Configure the index from the Flask app config"""
+        self.threshold = app.config.get('DEDUP_THRESHOLD', self.threshold)
+        self.configure(
+            app.config.get('DEDUP_NUM_PERM', self.num_perm),
+            app.config.get('DEDUP_BANDS', self.bands)
+        )
+        app.extensions['duplicate_index'] = self
+
+    def configure(self, num_perm, bands, seed=1):
+        if num_perm % bands:
+            raise ValueError("DEDUP_NUM_PERM must be a multiple of DEDUP_BANDS")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, title, description):
+        """MinHash signature of a product's title and description"""
+        hashes = [_hash64(shingle) for shingle in shingles(f"{title} {description}")] or [0]
+        return [
+            min((a * x + b) % MERSENNE_PRIME for x in hashes)
+            for a, b in self._permutations
+        ]
+
+    def buckets(self, signature):
+        """One bucket key per band, as signed 64-bit integers"""
+        keys = []
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(
+                array('Q', [band] + values).tobytes(), digest_size=8
+            ).digest()
+            keys.append(int.from_bytes(digest, 'little', signed=True))
+        return keys
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+    def find_duplicate(self, user_id, title, description, exclude_id=None, signature=None):
+        """Return (product_id, similarity) of the closest near duplicate, or None"""
+        signature = signature or self.signature(title, description)
+        best = None
+        for product_id, candidate in self._candidates(user_id, self.buckets(signature), exclude_id):
+            score = self.similarity(signature, candidate)
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (product_id, score)
+        return best
+
+    def index_product(self, product):
+        """Store the signature and buckets of a product (flushed with the caller's session)"""
+        self.remove_product(product.id)
+        signature = self.signature(product.title, product.description)
+        db.session.add(ProductSignature(
+            product_id=product.id,
+            user_id=product.user_id,
+            signature=array('Q', signature).tobytes()
+        ))
+        db.session.add_all([
+            ProductLSHBucket(user_id=product.user_id, bucket=bucket, product_id=product.id)
+            for bucket in self.buckets(signature)
+        ])
+
+    def remove_product(self, product_id):
+        """Delete a product's signature and buckets"""
+        self.remove_products([product_id])
+
+    def remove_products(self, product_ids):
+        """Delete the signatures and buckets of several products at once"""
+        ProductLSHBucket.query.filter(ProductLSHBucket.product_id.in_(product_ids)).delete(synchronize_session=False)
+        ProductSignature.query.filter(ProductSignature.product_id.in_(product_ids)).delete(synchronize_session=False)
+
+    def duplicate_groups(self, user_id):
+        """Groups of the user's products that are near duplicates of each other"""
+        shared = db.select(ProductLSHBucket.bucket).where(
+            ProductLSHBucket.user_id == user_id
+        ).group_by(ProductLSHBucket.bucket).having(db.func.count(ProductLSHBucket.id) > 1)
+
+        rows = db.session.query(ProductLSHBucket.bucket, ProductLSHBucket.product_id).filter(
+            ProductLSHBucket.user_id == user_id,
+            ProductLSHBucket.bucket.in_(shared)
+        ).all()
+
+        by_bucket = {}
+        for bucket, product_id in rows:
+            by_bucket.setdefault(bucket, set()).add(product_id)
+
+        signatures = self._load_signatures({product_id for _, product_id in rows})
+
+        # Union-find; within a bucket each member is compared against the bucket's
+        # distinct anchors rather than every other member, so exact-duplicate pileups
+        # stay linear
+        parent = {}
+
+        def find(item):
+            parent.setdefault(item, item)
+            while parent[item] != item:
+                parent[item] = parent[parent[item]]
+                item = parent[item]
+            return item
+
+        for members in by_bucket.values():
+            anchors = []
+            for product_id in sorted(members):
+                for anchor in anchors:
+                    if self.similarity(signatures[anchor], signatures[product_id]) >= self.threshold:
+                        parent[find(product_id)] = find(anchor)
+                        break
+                else:
+                    anchors.append(product_id)
+
+        groups = {}
+        for product_id in parent:
+            groups.setdefault(find(product_id), []).append(product_id)
+        return sorted(
+            (sorted(members) for members in groups.values() if len(members) > 1),
+            key=lambda members: members[0]
+        )
+
+    def _candidates(self, user_id, buckets, exclude_id=None):
+        product_ids = db.select(ProductLSHBucket.product_id).where(
+            ProductLSHBucket.user_id == user_id,
+            ProductLSHBucket.bucket.in_(buckets)
+        ).distinct()
+        if exclude_id is not None:
+            product_ids = product_ids.where(ProductLSHBucket.product_id != exclude_id)
+
+        rows = db.session.query(ProductSignature.product_id, ProductSignature.signature).filter(
+            ProductSignature.product_id.in_(product_ids)
+        ).all()
+        return [(product_id, _unpack(signature)) for product_id, signature in rows]
+
+    def _load_signatures(self, product_ids):
+        if not product_ids:
+            return {}
+        rows = db.session.query(ProductSignature.product_id, ProductSignature.signature).filter(
+            ProductSignature.product_id.in_(product_ids)
+        ).all()
+        return {product_id: _unpack(signature) for product_id, signature in rows}
+
+duplicate_index = DuplicateIndex()
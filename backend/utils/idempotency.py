@@ -0,0 +1,222 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, jsonify, make_response, request
+from flask.cli import AppGroup
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from models.models import IdempotencyKey, db
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+TRANSIENT_STATUSES = (429,)  # Plus every 5xx; retries of these run the request again
+
+class IdempotencyStore:
+    """Stored responses for POSTs sent with an ``Idempotency-Key`` header.
+
+    The first request with a key inserts an ``in_progress`` row holding a short lease
+    and runs the view; its response is saved on the row for ``ttl`` seconds and replayed
+    for retries with the same key and body. A duplicate arriving while the first is
+    still running waits for it (woken directly when both are in this process, otherwise
+    by polling) instead of running in parallel. Rows are written on their own
+    connection so other requests see them before the view's transaction commits.
+    """
+
+    def __init__(self):
+        self.ttl = 86400
+        self.lock_seconds = 120
+        self.wait_seconds = 30
+        self.poll_interval = 0.1
+        self.sweep_batch_size = 1000
+        self._lock = threading.Lock()
+        self._inflight = {}  # (user_id, key) -> threading.Event set when the owner finishes
+
+    def init_app(self, app):
+        """Configure the store from the Flask app config"""
+        self.ttl = app.config.get('IDEMPOTENCY_TTL', self.ttl)
+        self.lock_seconds = app.config.get('IDEMPOTENCY_LOCK_SECONDS', self.lock_seconds)
+        self.wait_seconds = app.config.get('IDEMPOTENCY_WAIT_SECONDS', self.wait_seconds)
+        self.sweep_batch_size = app.config.get('IDEMPOTENCY_SWEEP_BATCH_SIZE', self.sweep_batch_size)
+        app.extensions['idempotency_store'] = self
+        app.cli.add_command(idempotency_cli)
+
+    def acquire(self, user_id, key, request_hash):
+        """Claim a key; returns (outcome, row) with outcome acquired, replay, mismatch or in_progress"""
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            now = datetime.utcnow()
+            row_id = self._insert(user_id, key, request_hash, now)
+            if row_id is not None:
+                self._start(user_id, key)
+                return 'acquired', row_id
+
+            row = self._get(user_id, key)
+            if row is None:
+                continue  # Released or swept in between; try again
+            if row.expires_at <= now:
+                self._delete(row.id)
+                continue
+            if row.request_hash != request_hash:
+                return 'mismatch', row
+            if row.status == 'completed':
+                return 'replay', row
+            if row.locked_until is None or row.locked_until <= now:
+                # The request holding the key died without finishing; take it over
+                if self._take_over(row, now):
+                    self._start(user_id, key)
+                    return 'acquired', row.id
+                continue
+            if time.monotonic() >= deadline:
+                return 'in_progress', row
+            self._wait(user_id, key, deadline)
+
+    def complete(self, user_id, key, row_id, response):
+        """Save the response of an acquired key for replay"""
+        now = datetime.utcnow()
+        with db.engine.begin() as connection:
+            connection.execute(
+                db.update(IdempotencyKey).where(IdempotencyKey.id == row_id).values(
+                    status='completed',
+                    locked_until=None,
+                    response_status=response.status_code,
+                    response_body=response.get_data(as_text=True),
+                    response_mimetype=response.mimetype,
+                    expires_at=now + timedelta(seconds=self.ttl)
+                )
+            )
+        self._finish(user_id, key)
+
+    def release(self, user_id, key, row_id):
+        """Forget an acquired key so a retry runs the request again"""
+        self._delete(row_id)
+        self._finish(user_id, key)
+
+    def sweep(self):
+        """Delete expired keys in batches; returns the number deleted"""
+        deleted = 0
+        while True:
+            expired = db.select(IdempotencyKey.id).where(
+                IdempotencyKey.expires_at <= datetime.utcnow()
+            ).limit(self.sweep_batch_size)
+            with db.engine.begin() as connection:
+                count = connection.execute(
+                    db.delete(IdempotencyKey).where(IdempotencyKey.id.in_(expired))
+                ).rowcount
+            deleted += count
+            if count < self.sweep_batch_size:
+                return deleted
+
+    def _insert(self, user_id, key, request_hash, now):
+        try:
+            with db.engine.begin() as connection:
+                result = connection.execute(db.insert(IdempotencyKey).values(
+                    user_id=user_id,
+                    key=key,
+                    request_hash=request_hash,
+                    status='in_progress',
+                    locked_until=now + timedelta(seconds=self.lock_seconds),
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl)
+                ))
+                return result.inserted_primary_key[0]
+        except IntegrityError:
+            return None
+
+    def _get(self, user_id, key):
+        with db.engine.connect() as connection:
+            return connection.execute(
+                db.select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            ).first()
+
+    def _take_over(self, row, now):
+        with db.engine.begin() as connection:
+            return connection.execute(
+                db.update(IdempotencyKey).where(
+                    IdempotencyKey.id == row.id,
+                    IdempotencyKey.status == 'in_progress',
+                    db.or_(IdempotencyKey.locked_until.is_(None), IdempotencyKey.locked_until <= now)
+                ).values(locked_until=now + timedelta(seconds=self.lock_seconds))
+            ).rowcount == 1
+
+    def _delete(self, row_id):
+        with db.engine.begin() as connection:
+            connection.execute(db.delete(IdempotencyKey).where(IdempotencyKey.id == row_id))
+
+    def _start(self, user_id, key):
+        with self._lock:
+            self._inflight[(user_id, key)] = threading.Event()
+
+    def _finish(self, user_id, key):
+        with self._lock:
+            event = self._inflight.pop((user_id, key), None)
+        if event:
+            event.set()
+
+    def _wait(self, user_id, key, deadline):
+        """Block until the owner finishes (same process) or the next poll is due"""
+        with self._lock:
+            event = self._inflight.get((user_id, key))
+        remaining = max(deadline - time.monotonic(), 0)
+        if event:
+            event.wait(min(remaining, 1.0))
+        else:
+            time.sleep(min(remaining, self.poll_interval))
+
+idempotency_store = IdempotencyStore()
+
+def request_fingerprint():
+    """SHA-256 over the method, path and raw body of the current request"""
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.path.encode(), request.get_data()):
+        digest.update(part)
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+def idempotent(view):
+    """Replay stored responses for retried POSTs carrying an Idempotency-Key header.
+
+    Goes below ``@jwt_required()`` since keys are scoped to the current user.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        user_id = get_jwt_identity()
+        outcome, row = idempotency_store.acquire(user_id, key, request_fingerprint())
+
+        if outcome == 'mismatch':
+            return jsonify({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'}), 422
+        if outcome == 'in_progress':
+            return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+        if outcome == 'replay':
+            response = current_app.response_class(
+                row.response_body, status=row.response_status, mimetype=row.response_mimetype
+            )
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            idempotency_store.release(user_id, key, row)
+            raise
+
+        if response.status_code >= 500 or response.status_code in TRANSIENT_STATUSES:
+            idempotency_store.release(user_id, key, row)
+        else:
+            idempotency_store.complete(user_id, key, row, response)
+        return response
+    return wrapper
+
+idempotency_cli = AppGroup('idempotency', help='Manage stored idempotency keys.')
+
+@idempotency_cli.command('sweep')
+def sweep_command():
+    """Delete expired idempotency keys"""
+    print(f"Deleted {idempotency_store.sweep()} expired idempotency keys")
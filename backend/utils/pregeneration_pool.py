@@ -0,0 +1,233 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask.cli import AppGroup
+from models.models import ProductDraft, db
+from utils.template_registry import normalize_category, template_registry
+
+class PregenerationPool:
+    """Warm inventory of AI-generated product drafts per category.
+
+    Drafts are generated ahead of time (off-peak via ``flask pregen refill`` or in the
+    background whenever a category drops below its low-water mark) and handed out to
+    users with a single atomic ``UPDATE ... RETURNING`` claim. Refills ask the generator
+    for ``batch_size`` listings per LLM call.
+    """
+
+    def __init__(self, generator=None):
+        self.generator = generator
+        self.app = None
+        self.enabled = False
+        self.target_size = 20
+        self.low_water = 5
+        self.batch_size = 5
+        self.categories = []
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = {}  # category key -> monotonic time the refill was requested
+        self._metrics = {}  # category key -> refill metrics
+
+    def init_app(self, app):
+        """Configure the pool from the Flask app config"""
+        self.app = app
+        self.enabled = app.config.get('PREGEN_POOL_ENABLED', False)
+        self.target_size = app.config.get('PREGEN_POOL_TARGET_SIZE', self.target_size)
+        self.low_water = app.config.get('PREGEN_POOL_LOW_WATER', self.low_water)
+        self.batch_size = app.config.get('PREGEN_POOL_BATCH_SIZE', self.batch_size)
+        self.categories = app.config.get('PREGEN_POOL_CATEGORIES') or [
+            entry['name'] for entry in template_registry.categories()
+        ]
+        if self.enabled and self.generator is None:
+            from utils.ai_generator import AIProductGenerator
+            self.generator = AIProductGenerator()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pregen-pool')
+        app.extensions['pregeneration_pool'] = self
+        app.cli.add_command(pregen_cli)
+
+    def claim(self, category, user_id, count=1):
+        """Atomically claim up to `count` ready drafts for the user; empty if the pool is dry"""
+        if not self.enabled:
+            return []
+
+        key = normalize_category(category)
+        candidates = db.select(ProductDraft.id).where(
+            ProductDraft.category == key,
+            ProductDraft.claimed_by.is_(None)
+        ).order_by(ProductDraft.id).limit(count).with_for_update(skip_locked=True)
+
+        stmt = db.update(ProductDraft).where(
+            ProductDraft.id.in_(candidates),
+            ProductDraft.claimed_by.is_(None)
+        ).values(
+            claimed_by=user_id,
+            claimed_at=datetime.utcnow()
+        ).returning(
+            ProductDraft.id,
+            ProductDraft.title,
+            ProductDraft.description,
+            ProductDraft.price,
+            ProductDraft.keywords,
+            ProductDraft.prompt_used,
+            ProductDraft.ai_model,
+            ProductDraft.prompt_tokens,
+            ProductDraft.completion_tokens
+        )
+        rows = db.session.execute(stmt).all()
+
+        self.maybe_refill(key)
+
+        return [self._claimed(row) for row in rows]
+
+    def _claimed(self, row):
+        product_data = {
+            'draft_id': row.id,
+            'title': row.title,
+            'description': row.description,
+            'suggested_price': row.price,
+            'keywords': json.loads(row.keywords) if row.keywords else [],
+            'prompt_used': row.prompt_used,
+            'ai_model': row.ai_model
+        }
+        if row.prompt_tokens or row.completion_tokens:
+            # Charged to the claiming user once the claim is committed (usage_tracker.charge)
+            product_data['usage'] = {
+                'model': row.ai_model,
+                'prompt_tokens': row.prompt_tokens,
+                'completion_tokens': row.completion_tokens
+            }
+        return product_data
+
+    def release(self, draft_ids):
+        """Return claimed drafts to the pool (flushed with the caller's session)"""
+        if not draft_ids:
+            return
+        db.session.execute(
+            db.update(ProductDraft).where(ProductDraft.id.in_(draft_ids)).values(claimed_by=None, claimed_at=None)
+        )
+
+    def depth(self, category):
+        """Number of unclaimed drafts for a category"""
+        return ProductDraft.query.filter_by(
+            category=normalize_category(category), claimed_by=None
+        ).count()
+
+    def maybe_refill(self, category):
+        """Schedule a background refill if the category is below its low-water mark"""
+        key = normalize_category(category)
+        if self.depth(key) >= self.low_water:
+            return
+
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending[key] = time.monotonic()
+
+        self._executor.submit(self._refill_in_background, key)
+
+    def refill(self, category):
+        """Generate drafts until the category reaches its target size; returns the number added"""
+        key = normalize_category(category)
+        missing = self.target_size - self.depth(key)
+        added = 0
+
+        while added < missing:
+            batch = self.generator.generate_products(category, min(self.batch_size, missing - added))
+            # Templates stand in for failed generations; serving them from the pool would
+            # put demo listings ahead of real ones, so stop until the next refill
+            batch = [product_data for product_data in batch if not product_data.get('fallback')]
+            if not batch:
+                self.app.logger.warning(f"Pre-generation refill for {key} stopped: generation failed")
+                break
+            db.session.add_all([
+                ProductDraft(
+                    category=key,
+                    title=product_data['title'],
+                    description=product_data['description'],
+                    price=float(product_data['suggested_price']),
+                    keywords=json.dumps(product_data.get('keywords', [])),
+                    prompt_used=f"Category: {category}",
+                    ai_model=product_data.get('ai_model', 'gpt-4o-mini'),
+                    prompt_tokens=product_data.get('usage', {}).get('prompt_tokens', 0),
+                    completion_tokens=product_data.get('usage', {}).get('completion_tokens', 0)
+                )
+                for product_data in batch
+            ])
+            db.session.commit()
+            added += len(batch)
+
+        # Claimed drafts have already been copied into Product rows
+        ProductDraft.query.filter(
+            ProductDraft.category == key,
+            ProductDraft.claimed_by.isnot(None)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        return added
+
+    def refill_all(self):
+        """Refill every configured category; returns {category: drafts added}"""
+        return {category: self.refill(category) for category in self.categories}
+
+    def metrics(self):
+        """Pool depth and refill lag per category"""
+        counts = dict(db.session.query(
+            ProductDraft.category,
+            db.func.count(ProductDraft.id)
+        ).filter(ProductDraft.claimed_by.is_(None)).group_by(ProductDraft.category).all())
+
+        now = time.monotonic()
+        with self._lock:
+            pending = dict(self._pending)
+            refills = {key: dict(value) for key, value in self._metrics.items()}
+
+        keys = sorted(set(counts) | set(pending) | {normalize_category(c) for c in self.categories})
+        return {
+            'enabled': self.enabled,
+            'target_size': self.target_size,
+            'low_water': self.low_water,
+            'categories': {
+                key: {
+                    'depth': counts.get(key, 0),
+                    'refill_pending': key in pending,
+                    'refill_lag_seconds': round(now - pending[key], 3) if key in pending else 0.0,
+                    'last_refill_lag_seconds': refills.get(key, {}).get('last_refill_lag_seconds'),
+                    'last_refill_added': refills.get(key, {}).get('last_refill_added'),
+                    'last_refill_at': refills.get(key, {}).get('last_refill_at')
+                }
+                for key in keys
+            }
+        }
+
+    def _refill_in_background(self, key):
+        added = 0
+        try:
+            with self.app.app_context():
+                added = self.refill(key)
+        except Exception as e:
+            self.app.logger.error(f"Pre-generation refill error for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                requested_at = self._pending.pop(key, time.monotonic())
+                self._metrics[key] = {
+                    'last_refill_lag_seconds': round(time.monotonic() - requested_at, 3),
+                    'last_refill_added': added,
+                    'last_refill_at': datetime.utcnow().isoformat()
+                }
+
+pregeneration_pool = PregenerationPool()
+
+pregen_cli = AppGroup('pregen', help='Manage the pre-generated product pool.')
+
+@pregen_cli.command('refill')
+def refill_command():
+    """Top up every configured category (run off-peak, e.g. from cron)"""
+    for category, added in pregeneration_pool.refill_all().items():
+        print(f"{category}: +{added} drafts")
+
+@pregen_cli.command('status')
+def status_command():
+    """Print pool depth per category"""
+    print(json.dumps(pregeneration_pool.metrics(), indent=2))
@@ -0,0 +1,215 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+import numpy as np
+from models.models import Product, db
+
+class PricingAnalytics:
+    """Price distribution per category, computed with NumPy and cached.
+
+    Prices are pulled with one query ordered by category (for a user's catalog or all
+    products) and each category is summarized with vectorized percentiles, histograms
+    and IQR outlier fences. A user's stats are cached for ``cache_ttl`` seconds and
+    dropped as soon as one of their products changes in this process.
+
+    Global stats, which ``clamp_price`` reads on every generation, come from one
+    snapshot over all products that is rebuilt in the background once it is older than
+    ``cache_ttl``; requests never wait for that scan, and single-user writes don't
+    discard it.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.cache_ttl = 300
+        self.histogram_bins = 20
+        self.band_percentiles = (10, 90)
+        self.min_samples = 20
+        self.clamp_enabled = True
+        self._executor = None
+        self._lock = threading.Lock()
+        self._cache = {}  # (user_id, category or None) -> (expires_at, stats)
+        self._global = None  # (expires_at, {category: stats}) over all products
+        self._refreshing = False
+
+    def init_app(self, app):
+        """Configure pricing analytics from the Flask app config"""
+        self.app = app
+        self.cache_ttl = app.config.get('PRICING_CACHE_TTL', self.cache_ttl)
+        self.histogram_bins = app.config.get('PRICING_HISTOGRAM_BINS', self.histogram_bins)
+        self.band_percentiles = app.config.get('PRICING_BAND_PERCENTILES', self.band_percentiles)
+        self.min_samples = app.config.get('PRICING_MIN_SAMPLES', self.min_samples)
+        self.clamp_enabled = app.config.get('PRICING_CLAMP_ENABLED', self.clamp_enabled)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pricing-global')
+        app.extensions['pricing_analytics'] = self
+
+    def category_stats(self, user_id=None, category=None):
+        """{category: stats} for one category or all of them, for a user or globally"""
+        if user_id is None:
+            return self._global_stats(category)
+
+        key = (user_id, category or None)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        stats = self._compute(user_id, category)
+
+        with self._lock:
+            self._cache[key] = (now + self.cache_ttl, stats)
+        return stats
+
+    def global_snapshot(self):
+        """{category: stats} over all products as last computed, or {} before the first
+        refresh; never scans in the caller, only schedules a refresh when stale"""
+        with self._lock:
+            snapshot = self._global
+        if snapshot is None or snapshot[0] <= time.monotonic():
+            self._schedule_refresh()
+        return snapshot[1] if snapshot else {}
+
+    def refresh_global(self):
+        """Recompute the global snapshot now; returns it"""
+        stats = self._compute(None, None)
+        with self._lock:
+            self._global = (time.monotonic() + self.cache_ttl, stats)
+        return stats
+
+    def price_band(self, category):
+        """(low, high) recommended band from all products in the category, or None"""
+        summary = self.global_snapshot().get(category)
+        if summary and summary['count'] >= self.min_samples:
+            return summary['band']['low'], summary['band']['high']
+        return None
+
+    def clamp_price(self, category, price):
+        """Clamp a suggested price into the category's band when there is enough data"""
+        if not self.clamp_enabled:
+            return price
+        band = self.price_band(category)
+        if band is None:
+            return price
+        return round(min(max(float(price), band[0]), band[1]), 2)
+
+    def invalidate(self, user_id):
+        """Drop cached stats for a user's catalog after one of their products changed"""
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == user_id]:
+                del self._cache[key]
+
+    def _global_stats(self, category):
+        with self._lock:
+            warm = self._global is not None
+        if not warm:
+            # Cold start: answer the first request directly; a single category is
+            # cheap, and the full snapshot is then built in the background
+            if not category:
+                return self.refresh_global()
+            self._schedule_refresh()
+            return self._compute(None, category)
+
+        stats = self.global_snapshot()
+        if not category:
+            return stats
+        return {category: stats[category]} if category in stats else {}
+
+    def _schedule_refresh(self):
+        with self._lock:
+            if self._refreshing or self._executor is None:
+                return
+            self._refreshing = True
+        self._executor.submit(self._refresh_in_background)
+
+    def _refresh_in_background(self):
+        try:
+            with self.app.app_context():
+                self.refresh_global()
+        except Exception as e:
+            self.app.logger.error(f"Global pricing refresh failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _compute(self, user_id, category):
+        scope = [Product.user_id == user_id] if user_id is not None else []
+        if category:
+            scope.append(Product.category == category)
+
+        # One scan in (category, price) index order, split into categories on the way
+        stmt = db.select(Product.category, Product.price).where(*scope).order_by(Product.category)
+        return {
+            name: self._summarize(prices)
+            for name, prices in self._load_prices(stmt)
+            if len(prices)
+        }
+
+    def _load_prices(self, stmt):
+        """Run a (category, price) query straight on the DBAPI cursor; yields (category, float64 array).
+
+        Skipping SQLAlchemy row objects makes loading several times faster on large
+        categories; rows arrive grouped by category, so ``groupby`` splits them in the
+        same pass without building per-row Python lists.
+        """
+        connection = db.session.connection()
+        compiled = stmt.compile(dialect=connection.dialect)
+        params = compiled.params
+        if compiled.positional:
+            params = tuple(params[name] for name in compiled.positiontup)
+
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(str(compiled), params)
+            for name, rows in groupby(cursor, key=itemgetter(0)):
+                yield name, np.fromiter(map(itemgetter(1), rows), dtype=np.float64)
+        finally:
+            cursor.close()
+
+    def _summarize(self, prices):
+        low_pct, high_pct = self.band_percentiles
+        p5, p10, p25, p50, p75, p90, p95, band_low, band_high = np.percentile(
+            prices, [5, 10, 25, 50, 75, 90, 95, low_pct, high_pct]
+        )
+        iqr = p75 - p25
+        low_fence = p25 - 1.5 * iqr
+        high_fence = p75 + 1.5 * iqr
+        outlier_mask = (prices < low_fence) | (prices > high_fence)
+        inliers = prices[~outlier_mask]
+
+        counts, edges = np.histogram(inliers if len(inliers) else prices, bins=self.histogram_bins)
+
+        return {
+            'count': int(len(prices)),
+            'mean': round(float(prices.mean()), 2),
+            'std': round(float(prices.std()), 2),
+            'min': round(float(prices.min()), 2),
+            'max': round(float(prices.max()), 2),
+            'percentiles': {
+                'p5': round(float(p5), 2),
+                'p10': round(float(p10), 2),
+                'p25': round(float(p25), 2),
+                'p50': round(float(p50), 2),
+                'p75': round(float(p75), 2),
+                'p90': round(float(p90), 2),
+                'p95': round(float(p95), 2)
+            },
+            'histogram': {
+                'edges': [round(float(edge), 2) for edge in edges],
+                'counts': counts.tolist()
+            },
+            'outliers': {
+                'count': int(outlier_mask.sum()),
+                'low_fence': round(float(low_fence), 2),
+                'high_fence': round(float(high_fence), 2)
+            },
+            'band': {
+                'low': round(float(band_low), 2),
+                'high': round(float(band_high), 2),
+                'recommended': round(float(np.median(inliers if len(inliers) else prices)), 2)
+            }
+        }
+
+pricing_analytics = PricingAnalytics()
@@ -0,0 +1,210 @@
+import json
+import math
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from flask.cli import AppGroup
+import numpy as np
+from models.models import Product, ProductEmbedding, db
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to '
+    'with your you our we will can these those their them they perfect'.split()
+)
+
+class SimilarityIndex:
+    """Product-to-product similarity over locally computed hashed TF-IDF vectors.
+
+    Each product is hashed into a ``dimensions``-wide float32 vector (title and keywords
+    weighted above the description) and stored as a blob. Searches load the user's
+    vectors into a cached matrix, apply IDF weights computed from that matrix and rank
+    by cosine similarity with one matrix-vector product. Catalogs above
+    ``ann_threshold`` first shortlist candidates by Hamming distance between random
+    hyperplane signatures, then rerank the shortlist exactly.
+    """
+
+    def __init__(self, dimensions=256, cache_users=32, ann_threshold=50000, ann_candidates=2000):
+        self.dimensions = dimensions
+        self.cache_users = cache_users
+        self.ann_threshold = ann_threshold
+        self.ann_candidates = ann_candidates
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # user_id -> (version, matrix entry)
+        self._hyperplanes = None
+
+    def init_app(self, app):
+        """Configure the index from the Flask app config"""
+        self.dimensions = app.config.get('SIMILAR_DIMENSIONS', self.dimensions)
+        self.cache_users = app.config.get('SIMILAR_CACHE_USERS', self.cache_users)
+        self.ann_threshold = app.config.get('SIMILAR_ANN_THRESHOLD', self.ann_threshold)
+        self.ann_candidates = app.config.get('SIMILAR_ANN_CANDIDATES', self.ann_candidates)
+        self._hyperplanes = None
+        app.extensions['similarity_index'] = self
+        app.cli.add_command(similarity_cli)
+
+    def vectorize(self, title, description, keywords=None):
+        """Hashed, sublinear term-frequency vector, L2-normalized"""
+        if isinstance(keywords, str):
+            try:
+                keywords = json.loads(keywords)
+            except json.JSONDecodeError:
+                keywords = [keywords]
+
+        counts = {}
+        fields = ((title, 2.0), (' '.join(keywords or []), 2.0), (description, 1.0))
+        for text, weight in fields:
+            for token in WORD_PATTERN.findall((text or '').lower()):
+                if token not in STOPWORDS and len(token) > 1:
+                    counts[token] = counts.get(token, 0.0) + weight
+
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token, count in counts.items():
+            digest = zlib.crc32(token.encode('utf-8'))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dimensions] += sign * (1.0 + math.log(count))
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def index_product(self, product):
+        """Store or refresh a product's vector (flushed with the caller's session)"""
+        vector = self.vectorize(product.title, product.description, product.keywords).tobytes()
+        embedding = ProductEmbedding.query.get(product.id)
+        if embedding:
+            embedding.vector = vector
+        else:
+            db.session.add(ProductEmbedding(product_id=product.id, user_id=product.user_id, vector=vector))
+
+    def remove_product(self, product_id):
+        """Delete a product's vector"""
+        self.remove_products([product_id])
+
+    def remove_products(self, product_ids):
+        """Delete the vectors of several products at once"""
+        ProductEmbedding.query.filter(ProductEmbedding.product_id.in_(product_ids)).delete(synchronize_session=False)
+
+    def similar(self, user_id, product_id, k=10):
+        """Top-k (product_id, score) most similar to a product in the user's catalog"""
+        entry = self._load(user_id)
+        position = entry['positions'].get(product_id)
+        if position is None:
+            return []
+
+        weighted = entry['weighted']
+        query = weighted[position]
+
+        if len(weighted) > self.ann_threshold:
+            distances = self._hamming(entry['signatures'], entry['signatures'][position])
+            shortlist = np.argpartition(distances, min(self.ann_candidates, len(distances) - 1))[:self.ann_candidates]
+            scores = weighted[shortlist] @ query
+            candidates = shortlist
+        else:
+            scores = weighted @ query
+            candidates = None
+
+        # Exclude the product itself, then take the top k without a full sort
+        if candidates is None:
+            scores[position] = -np.inf
+        else:
+            scores[candidates == position] = -np.inf
+        k = min(k, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        ids = entry['ids']
+        if candidates is not None:
+            top_positions = candidates[top]
+        else:
+            top_positions = top
+        return [(int(ids[i]), float(score)) for i, score in zip(top_positions, scores[top])]
+
+    def backfill(self, batch_size=1000):
+        """Vectorize products that have no embedding yet; returns the number indexed"""
+        indexed = 0
+        while True:
+            products = Product.query.outerjoin(
+                ProductEmbedding, ProductEmbedding.product_id == Product.id
+            ).filter(ProductEmbedding.product_id.is_(None)).order_by(Product.id).limit(batch_size).all()
+            if not products:
+                return indexed
+            db.session.add_all([
+                ProductEmbedding(
+                    product_id=product.id,
+                    user_id=product.user_id,
+                    vector=self.vectorize(product.title, product.description, product.keywords).tobytes()
+                )
+                for product in products
+            ])
+            db.session.commit()
+            indexed += len(products)
+
+    def _load(self, user_id):
+        """The user's IDF-weighted matrix, rebuilt only when their vectors changed"""
+        version = tuple(db.session.query(
+            db.func.count(ProductEmbedding.product_id),
+            db.func.max(ProductEmbedding.updated_at)
+        ).filter(ProductEmbedding.user_id == user_id).one())
+
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached and cached[0] == version:
+                self._cache.move_to_end(user_id)
+                return cached[1]
+
+        rows = db.session.query(ProductEmbedding.product_id, ProductEmbedding.vector).filter(
+            ProductEmbedding.user_id == user_id
+        ).order_by(ProductEmbedding.product_id).all()
+
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        matrix = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.float32)
+        matrix = matrix.reshape(len(rows), self.dimensions) if len(rows) else matrix.reshape(0, self.dimensions)
+
+        # IDF per hashed dimension from this catalog, then re-normalize the rows
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        idf = np.log((1 + len(rows)) / (1 + document_frequency)).astype(np.float32) + 1
+        weighted = matrix * idf
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        weighted /= np.where(norms == 0, 1, norms)
+
+        entry = {
+            'ids': ids,
+            'positions': {int(product_id): i for i, product_id in enumerate(ids)},
+            'weighted': weighted,
+            'signatures': self._signatures(weighted) if len(rows) > self.ann_threshold else None
+        }
+
+        with self._lock:
+            self._cache[user_id] = (version, entry)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_users:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _signatures(self, weighted):
+        """64 random-hyperplane sign bits per row, packed into one uint64"""
+        if self._hyperplanes is None or self._hyperplanes.shape[0] != self.dimensions:
+            rng = np.random.default_rng(1)
+            self._hyperplanes = rng.standard_normal((self.dimensions, 64)).astype(np.float32)
+        return np.packbits(weighted @ self._hyperplanes > 0, axis=1).view(np.uint64).ravel()
+
+    @staticmethod
+    def _hamming(signatures, query):
+        """Vectorized popcount of signatures XOR query (SWAR bit counting)"""
+        x = signatures ^ query
+        x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+similarity_index = SimilarityIndex()
+
+similarity_cli = AppGroup('similarity', help='Manage product similarity vectors.')
+
+@similarity_cli.command('backfill')
+def backfill_command():
+    """Vectorize existing products that have no embedding"""
+    print(f"Indexed {similarity_index.backfill()} products")
@@ -1,6 +1,25 @@
 import stripe
 from flask import current_app
 from models.models import User, db
+from utils.subscriptions import from_timestamp, subscription_lifecycle
+
+def map_subscription_status(stripe_status):
+    """Map a Stripe subscription status to User.subscription_status"""
+    if stripe_status == 'active':
+        return 'active'
+    elif stripe_status == 'trialing':
+        return 'trial'
+    elif stripe_status == 'past_due':
+        return 'past_due'
+    elif stripe_status in ['canceled', 'incomplete_expired']:
+        return 'canceled'
+    return 'inactive'
+
+def subscription_period_end(subscription):
+    """End of a Stripe subscription's current trial or billing period (naive UTC), or None"""
+    if subscription['status'] == 'trialing':
+        return from_timestamp(subscription.get('trial_end'))
+    return from_timestamp(subscription.get('current_period_end'))
 
 class StripeService:
     def __init__(self):
@@ -12,8 +31,13 @@ class StripeService:
         if not secret_key:
             raise ValueError("Stripe secret key not configured")
         self.stripe.api_key = secret_key
+        
+        # Point at a local Stripe-compatible server (e.g. stripe-mock) when configured
+        api_base = current_app.config.get('STRIPE_API_BASE')
+        if api_base:
+            self.stripe.api_base = api_base
     
-    def create_customer(self, email, user_id):
+    def create_customer(self, email, user_id, idempotency_key=None):
         """Create a Stripe customer"""
         if not self.stripe.api_key:
             self.initialize_stripe()
@@ -21,17 +45,23 @@ class StripeService:
         try:
             customer = self.stripe.Customer.create(
                 email=email,
-                metadata={'user_id': str(user_id)}
+                metadata={'user_id': str(user_id)},
+                idempotency_key=idempotency_key
             )
             return customer
         except stripe.error.StripeError as e:
             current_app.logger.error(f"Stripe customer creation error: {str(e)}")
             raise
     
-    def create_trial_checkout_session(self, customer_id, user_email):
+    def create_trial_checkout_session(self, customer_id, user_email, user=None):
         """Create a Stripe checkout session for $1 trial"""
         if not self.stripe.api_key:
             self.initialize_stripe()
+        
+        if not customer_id and user is not None:
+            # Signup defers customer creation; create it now if the worker hasn't yet
+            from utils.customer_provisioning import customer_provisioner
+            customer_id = customer_provisioner.ensure_customer(user)
             
         try:
             trial_price_id = current_app.config.get('TRIAL_PRICE_ID')
@@ -66,10 +96,14 @@ class StripeService:
             current_app.logger.error(f"Stripe checkout session error: {str(e)}")
             raise
     
-    def create_subscription_checkout_session(self, customer_id, user_email):
+    def create_subscription_checkout_session(self, customer_id, user_email, user=None):
         """Create a Stripe checkout session for full subscription"""
         if not self.stripe.api_key:
             self.initialize_stripe()
+        
+        if not customer_id and user is not None:
+            from utils.customer_provisioning import customer_provisioner
+            customer_id = customer_provisioner.ensure_customer(user)
             
         try:
             subscription_price_id = current_app.config.get('SUBSCRIPTION_PRICE_ID')
@@ -130,9 +164,10 @@ class StripeService:
         user = User.query.filter_by(stripe_customer_id=customer_id).first()
         if user:
             user.subscription_id = subscription['id']
-            user.subscription_status = 'trial' if subscription.get('trial_start') else 'active'
             if subscription.get('trial_start'):
-                user.trial_used = True
+                subscription_lifecycle.start_trial(user, from_timestamp(subscription.get('trial_end')))
+            else:
+                subscription_lifecycle.activate(user, from_timestamp(subscription.get('current_period_end')))
             db.session.commit()
     
     def _handle_subscription_updated(self, event):
@@ -142,16 +177,12 @@ class StripeService:
         
         user = User.query.filter_by(stripe_customer_id=customer_id).first()
         if user:
-            status = subscription['status']
-            if status == 'active':
-                user.subscription_status = 'active'
-            elif status == 'trialing':
-                user.subscription_status = 'trial'
-            elif status in ['canceled', 'incomplete_expired']:
-                user.subscription_status = 'canceled'
-            else:
-                user.subscription_status = 'inactive'
-            
+            subscription_lifecycle.sync(
+                user,
+                map_subscription_status(subscription['status']),
+                period_end=subscription_period_end(subscription),
+                cancel_at_period_end=bool(subscription.get('cancel_at_period_end'))
+            )
             db.session.commit()
     
     def _handle_subscription_deleted(self, event):
@@ -161,7 +192,7 @@ class StripeService:
         
         user = User.query.filter_by(stripe_customer_id=customer_id).first()
         if user:
-            user.subscription_status = 'canceled'
+            subscription_lifecycle.end(user)
             user.subscription_id = None
             db.session.commit()
     
@@ -171,9 +202,10 @@ class StripeService:
         customer_id = invoice['customer']
         
         user = User.query.filter_by(stripe_customer_id=customer_id).first()
-        if user and user.subscription_status == 'trial':
-            # If this is the first payment after trial, mark as active
-            user.subscription_status = 'active'
+        if user:
+            # First payment after the trial, or a renewal: start the new period
+            period_end = max((line.get('period', {}).get('end') or 0 for line in invoice.get('lines', {}).get('data', [])), default=0)
+            subscription_lifecycle.payment_succeeded(user, from_timestamp(period_end))
             db.session.commit()
     
     def _handle_payment_failed(self, event):
@@ -183,6 +215,6 @@ class StripeService:
         
         user = User.query.filter_by(stripe_customer_id=customer_id).first()
         if user:
-            # Mark subscription as inactive due to payment failure
-            user.subscription_status = 'inactive'
+            # Keep access through the grace period while Stripe retries the payment
+            subscription_lifecycle.payment_failed(user)
             db.session.commit()
\ No newline at end of file
@@ -0,0 +1,188 @@
+from types import SimpleNamespace
+import click
+from models.models import User, db
+from utils.customer_provisioning import stripe_cli
+from utils.stripe_service import StripeService, map_subscription_status, subscription_period_end
+from utils.subscriptions import ENTITLED_STATUSES, subscription_lifecycle
+
+# User columns a reconciliation may correct
+SYNCED_FIELDS = (
+    'subscription_status', 'subscription_id', 'trial_used',
+    'current_period_end', 'cancel_at_period_end', 'next_transition_at'
+)
+
+class SubscriptionReconciler:
+    """Repairs users' subscription state and schedule from Stripe's list of subscriptions.
+
+    Subscriptions are streamed with auto-pagination and handled one page at a time:
+    a single ``IN`` query loads the matching users and corrections are applied with one
+    bulk UPDATE per page. Memory is bounded by the page size plus the set of customer
+    IDs already resolved during the run.
+    """
+
+    def __init__(self, stripe_service=None, page_size=100):
+        self.stripe_service = stripe_service or StripeService()
+        self.page_size = page_size
+
+    def init_app(self, app):
+        """Configure the reconciler from the Flask app config"""
+        self.page_size = app.config.get('STRIPE_RECONCILE_PAGE_SIZE', self.page_size)
+        app.extensions['subscription_reconciler'] = self
+        app.cli.add_command(stripe_cli)
+
+    def list_subscriptions(self):
+        """Stream every subscription from Stripe, newest first"""
+        if not self.stripe_service.stripe.api_key:
+            self.stripe_service.initialize_stripe()
+        return self.stripe_service.stripe.Subscription.list(
+            status='all', limit=self.page_size
+        ).auto_paging_iter()
+
+    def list_customer_subscriptions(self, customer_id):
+        """Every subscription of one customer, fetched now"""
+        if not self.stripe_service.stripe.api_key:
+            self.stripe_service.initialize_stripe()
+        return self.stripe_service.stripe.Subscription.list(
+            customer=customer_id, status='all', limit=self.page_size
+        ).auto_paging_iter()
+
+    def reconcile(self, subscriptions=None, dry_run=False):
+        """Diff Stripe subscriptions against users and correct mismatches; returns stats"""
+        subscriptions = self.list_subscriptions() if subscriptions is None else subscriptions
+        stats = {'subscriptions': 0, 'users_matched': 0, 'corrected': 0, 'expired': 0}
+        resolved = {}  # customer ID -> True once the customer has an entitling subscription
+
+        page = []
+        for subscription in subscriptions:
+            page.append(subscription)
+            if len(page) >= self.page_size:
+                self._reconcile_page(page, resolved, stats, dry_run)
+                page = []
+        if page:
+            self._reconcile_page(page, resolved, stats, dry_run)
+
+        self._expire_unmatched(resolved, stats, dry_run)
+        return stats
+
+    def _reconcile_page(self, page, resolved, stats, dry_run):
+        stats['subscriptions'] += len(page)
+
+        # Pick one subscription per customer; an entitling one beats the rest, and a
+        # customer already resolved as entitled on an earlier page is left alone
+        desired = {}
+        for subscription in page:
+            customer_id = subscription['customer']
+            status = map_subscription_status(subscription['status'])
+            entitled = status in ENTITLED_STATUSES
+            if customer_id in resolved and (resolved[customer_id] or not entitled):
+                continue
+            desired[customer_id] = (
+                status, subscription['id'], subscription_period_end(subscription),
+                bool(subscription.get('cancel_at_period_end'))
+            )
+            resolved[customer_id] = entitled
+
+        if not desired:
+            return
+
+        users = db.session.query(User.id, User.stripe_customer_id, *(getattr(User, field) for field in SYNCED_FIELDS)).filter(
+            User.stripe_customer_id.in_(list(desired))
+        ).all()
+        stats['users_matched'] += len(users)
+
+        updates = []
+        for user in users:
+            status, subscription_id, period_end, cancel_at_period_end = desired[user.stripe_customer_id]
+            # Apply Stripe's state with the same rules as the webhooks, on a detached copy
+            state = SimpleNamespace(**user._asdict())
+            subscription_lifecycle.sync(state, status, period_end, cancel_at_period_end)
+            state.subscription_id = subscription_id
+            update = {
+                field: getattr(state, field) for field in SYNCED_FIELDS
+                if getattr(state, field) != getattr(user, field)
+            }
+            if update:
+                update['id'] = user.id
+                updates.append(update)
+
+        stats['corrected'] += len(updates)
+        if updates and not dry_run:
+            # Group by key set so each group is one executemany UPDATE by primary key
+            for keys in {tuple(sorted(update)) for update in updates}:
+                db.session.execute(db.update(User), [u for u in updates if tuple(sorted(u)) == keys])
+            db.session.commit()
+
+    def _expire_unmatched(self, resolved, stats, dry_run):
+        """Users entitled locally but without any subscription in Stripe lose access.
+
+        The listing is newest first, so a customer who subscribed while it was streaming
+        is missing from it. Each candidate is therefore looked up in Stripe again: found
+        subscriptions are reconciled like a listing page, and a user is only expired if
+        its row still holds the state that was checked.
+        """
+        last_id = 0
+        while True:
+            rows = db.session.query(
+                User.id, User.stripe_customer_id, User.subscription_status, User.subscription_id, User.current_period_end
+            ).filter(
+                User.id > last_id,
+                User.subscription_status.in_(ENTITLED_STATUSES),
+                User.stripe_customer_id.isnot(None),
+                ~User.stripe_customer_id.like('cus_demo_%')
+            ).order_by(User.id).limit(self.page_size * 10).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+
+            candidates = [row for row in rows if row.stripe_customer_id not in resolved]
+            found = []
+            stale = []
+            for row in candidates:
+                subscriptions = list(self.list_customer_subscriptions(row.stripe_customer_id))
+                if subscriptions:
+                    found.extend(subscriptions)
+                else:
+                    stale.append(row)
+            if found:
+                self._reconcile_page(found, resolved, stats, dry_run)
+
+            if not stale:
+                continue
+            if dry_run:
+                stats['expired'] += len(stale)
+                continue
+
+            # A webhook may have changed the user since it was read; leave those rows alone
+            table = User.__table__
+            result = db.session.execute(
+                db.update(table).where(
+                    table.c.id == db.bindparam('user_id'),
+                    table.c.subscription_status == db.bindparam('checked_status'),
+                    table.c.subscription_id.is_not_distinct_from(db.bindparam('checked_subscription_id')),
+                    table.c.current_period_end.is_not_distinct_from(db.bindparam('checked_period_end'))
+                ).values(subscription_status='inactive', subscription_id=None, next_transition_at=None),
+                [
+                    {
+                        'user_id': row.id,
+                        'checked_status': row.subscription_status,
+                        'checked_subscription_id': row.subscription_id,
+                        'checked_period_end': row.current_period_end
+                    }
+                    for row in stale
+                ]
+            )
+            db.session.commit()
+            stats['expired'] += result.rowcount
+
+subscription_reconciler = SubscriptionReconciler()
+
+@stripe_cli.command('reconcile-subscriptions')
+@click.option('--dry-run', is_flag=True, help='Report corrections without writing them.')
+def reconcile_subscriptions_command(dry_run):
+    """Correct subscription statuses from Stripe's subscription list"""
+    stats = subscription_reconciler.reconcile(dry_run=dry_run)
+    prefix = "Would correct" if dry_run else "Corrected"
+    print(
+        f"Scanned {stats['subscriptions']} subscriptions, matched {stats['users_matched']} users. "
+        f"{prefix} {stats['corrected']} users and expired {stats['expired']} without a subscription."
+    )
@@ -0,0 +1,204 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from models.models import User, db
+from utils.clock import clock
+
+ENTITLED_STATUSES = ('trial', 'active', 'past_due')
+
+class SubscriptionLifecycle:
+    """Subscription state machine with scheduled, batched transitions.
+
+    Every entitled user carries ``current_period_end`` and ``next_transition_at``.
+    Events (checkout, webhooks, cancel requests) move a user between states and set
+    the next due time; the scheduler applies due transitions in indexed batches:
+
+    - trial/active with ``cancel_at_period_end`` -> canceled
+    - trial/active at period end -> past_due for a grace period while the renewal
+      payment is pending (renewed locally in demo mode, where there is no Stripe)
+    - past_due at the end of the grace period -> inactive
+
+    ``User.is_subscribed()`` applies the same rules in memory, so a transition that
+    is due but not processed yet never grants access it should not.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.trial_days = 7
+        self.period_days = 30
+        self.grace_days = 3
+        self.batch_size = 500
+        self.poll_interval = 60
+        self._worker = None
+
+    def init_app(self, app):
+        """Configure the lifecycle from the Flask app config"""
+        self.app = app
+        self.trial_days = app.config.get('SUBSCRIPTION_TRIAL_DAYS', self.trial_days)
+        self.period_days = app.config.get('SUBSCRIPTION_PERIOD_DAYS', self.period_days)
+        self.grace_days = app.config.get('SUBSCRIPTION_GRACE_DAYS', self.grace_days)
+        self.batch_size = app.config.get('SUBSCRIPTION_SCHEDULER_BATCH_SIZE', self.batch_size)
+        self.poll_interval = app.config.get('SUBSCRIPTION_SCHEDULER_INTERVAL', self.poll_interval)
+        app.extensions['subscription_lifecycle'] = self
+        app.cli.add_command(subscriptions_cli)
+
+        if app.config.get('SUBSCRIPTION_SCHEDULER') and self._worker is None:
+            self._worker = threading.Thread(target=self._run_forever, name='subscription-scheduler', daemon=True)
+            self._worker.start()
+
+    def stripe_enabled(self):
+        return bool(current_app.config.get('STRIPE_SECRET_KEY'))
+
+    # Events; each updates the user in memory and the caller commits
+
+    def start_trial(self, user, trial_end=None):
+        """Start the user's trial, ending at `trial_end` or after the configured trial length"""
+        user.subscription_status = 'trial'
+        user.trial_used = True
+        self._schedule(user, trial_end or clock.now() + timedelta(days=self.trial_days))
+
+    def activate(self, user, period_end=None):
+        """Start (or renew) a paid period ending at `period_end` or after one billing period"""
+        user.subscription_status = 'active'
+        self._schedule(user, period_end or clock.now() + timedelta(days=self.period_days))
+
+    def payment_succeeded(self, user, period_end=None):
+        """A renewal or first payment went through"""
+        if user.subscription_status != 'canceled':
+            self.activate(user, period_end)
+
+    def payment_failed(self, user):
+        """Keep access for the grace period while the payment is retried"""
+        if user.subscription_status not in ENTITLED_STATUSES:
+            return
+        grace_end = self._grace_end(user)
+        user.subscription_status = 'past_due'
+        user.current_period_end = grace_end
+        user.next_transition_at = grace_end
+
+    def cancel(self, user):
+        """Cancel at the end of the current period; returns that time, or None if canceled now"""
+        if user.current_period_end and user.current_period_end > clock.now() and user.subscription_status != 'past_due':
+            user.cancel_at_period_end = True
+            return user.current_period_end
+        self.end(user)
+        return None
+
+    def end(self, user, status='canceled'):
+        """End the subscription immediately"""
+        user.subscription_status = status
+        user.cancel_at_period_end = False
+        user.next_transition_at = None
+
+    def sync(self, user, status, period_end=None, cancel_at_period_end=False):
+        """Adopt state reported by Stripe for the user's subscription"""
+        if status == 'past_due':
+            # Stripe has usually rolled current_period_end over to the next period by
+            # now; access lasts for the grace period, not until that date
+            grace_end = self._grace_end(user)
+            user.subscription_status = status
+            self._schedule(user, grace_end, cancel_at_period_end)
+            return
+        user.subscription_status = status
+        if status == 'trial':
+            user.trial_used = True
+        if status in ENTITLED_STATUSES and period_end:
+            self._schedule(user, period_end, cancel_at_period_end)
+        else:
+            user.cancel_at_period_end = False
+            user.next_transition_at = None
+
+    # Scheduler
+
+    def process_due(self, now=None):
+        """Apply every due transition in batches; returns counts by new status"""
+        now = now or clock.now()
+        counts = {}
+        while True:
+            rows = db.session.execute(
+                db.select(
+                    User.id, User.subscription_status, User.cancel_at_period_end, User.current_period_end
+                ).where(
+                    User.next_transition_at <= now
+                ).order_by(User.next_transition_at).limit(self.batch_size).with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                return counts
+
+            updates = [self._transition(row, now) for row in rows]
+            db.session.execute(db.update(User), updates)
+            db.session.commit()
+            for update in updates:
+                counts[update['subscription_status']] = counts.get(update['subscription_status'], 0) + 1
+
+    def _transition(self, row, now):
+        """New column values for one user whose transition is due"""
+        update = {
+            'id': row.id,
+            'subscription_status': row.subscription_status,
+            'cancel_at_period_end': False,
+            'current_period_end': row.current_period_end,
+            'next_transition_at': None
+        }
+        period_end = row.current_period_end or now
+
+        if row.subscription_status in ('trial', 'active'):
+            if row.cancel_at_period_end:
+                update['subscription_status'] = 'canceled'
+            elif not self.stripe_enabled():
+                # Demo mode: nothing will bill the user, so renew locally
+                while period_end <= now:
+                    period_end += timedelta(days=self.period_days)
+                update.update(subscription_status='active', current_period_end=period_end, next_transition_at=period_end)
+            else:
+                grace_end = period_end + timedelta(days=self.grace_days)
+                update.update(subscription_status='past_due', current_period_end=grace_end, next_transition_at=grace_end)
+        elif row.subscription_status == 'past_due':
+            update['subscription_status'] = 'canceled' if row.cancel_at_period_end else 'inactive'
+
+        return update
+
+    def _grace_end(self, user):
+        """End of the grace period for a failed payment; repeated failures don't extend it"""
+        grace_end = clock.now() + timedelta(days=self.grace_days)
+        if user.subscription_status == 'past_due' and user.current_period_end:
+            grace_end = min(grace_end, user.current_period_end)
+        return grace_end
+
+    def _schedule(self, user, period_end, cancel_at_period_end=False):
+        user.current_period_end = period_end
+        user.next_transition_at = period_end
+        user.cancel_at_period_end = cancel_at_period_end
+
+    def _run_forever(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.process_due()
+            except Exception as e:
+                self.app.logger.error(f"Subscription scheduler error: {str(e)}")
+            time.sleep(self.poll_interval)
+
+subscription_lifecycle = SubscriptionLifecycle()
+
+def from_timestamp(value):
+    """Naive UTC datetime from a Stripe unix timestamp, or None"""
+    return datetime.utcfromtimestamp(value) if value else None
+
+subscriptions_cli = AppGroup('subscriptions', help='Subscription lifecycle jobs.')
+
+@subscriptions_cli.command('process-due')
+@click.option('--watch', is_flag=True, help='Keep polling for due transitions.')
+def process_due_command(watch):
+    """Apply due trial expiries, renewals, grace-period ends and cancellations"""
+    while True:
+        counts = subscription_lifecycle.process_due()
+        if counts or not watch:
+            summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items())) or 'nothing due'
+            print(f"Processed subscription transitions: {summary}")
+        if not watch:
+            return
+        time.sleep(subscription_lifecycle.poll_interval)
@@ -0,0 +1,113 @@
+import copy
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'product_templates.json'
+)
+
+def normalize_category(category):
+    """Normalize a category name for lookups ("  Fashion " -> "fashion")"""
+    return ' '.join(str(category or '').split()).lower()
+
+class TemplateRegistry:
+    """Product templates loaded once from a data file and indexed by normalized category.
+
+    The file is re-read when its modification time changes (checked at most every
+    ``reload_interval`` seconds), so templates can be edited without restarting workers.
+    """
+
+    def __init__(self, path=None, reload_interval=5):
+        self.path = path or DEFAULT_TEMPLATES_PATH
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._snapshot = None  # (templates, categories, default_key), swapped atomically
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def init_app(self, app):
+        """Configure the registry from the Flask app config"""
+        self.path = app.config.get('PRODUCT_TEMPLATES_PATH') or self.path
+        self.reload_interval = app.config.get('PRODUCT_TEMPLATES_RELOAD_INTERVAL', self.reload_interval)
+        self.reload()
+
+    def get_template(self, category):
+        """Return a copy of a template for the category, or for the default category"""
+        templates, _, default_key = self._get_snapshot()
+        choices = templates.get(normalize_category(category)) or templates[default_key]
+        template = copy.deepcopy(random.choice(choices))
+        template['category'] = category
+        return template
+
+    def categories(self):
+        """Return the known categories with their template counts"""
+        return [dict(entry) for entry in self._get_snapshot()[1]]
+
+    def default_category(self):
+        """Return the display name of the default category"""
+        templates, categories, default_key = self._get_snapshot()
+        for entry in categories:
+            if normalize_category(entry['name']) == default_key:
+                return entry['name']
+        return default_key
+
+    def reload(self):
+        """Force a reload of the templates file"""
+        with self._lock:
+            self._load()
+
+    def _get_snapshot(self):
+        now = time.monotonic()
+        if self._snapshot is None or now - self._checked_at >= self.reload_interval:
+            with self._lock:
+                if self._snapshot is None or now - self._checked_at >= self.reload_interval:
+                    self._checked_at = now
+                    if self._snapshot is None or self._current_mtime() != self._mtime:
+                        self._load()
+        return self._snapshot
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return self._mtime
+
+    def _load(self):
+        """Read the templates file; on error keep serving the previous snapshot"""
+        mtime = self._current_mtime()
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+
+            templates = {}
+            names = {}
+            for name, entries in data['categories'].items():
+                key = normalize_category(name)
+                templates.setdefault(key, []).extend(entries)
+                names.setdefault(key, name)
+
+            default_key = normalize_category(data.get('default_category')) or next(iter(templates))
+            if not templates.get(default_key):
+                raise ValueError(f"Default category has no templates: {default_key}")
+
+            categories = tuple(
+                {'name': names[key], 'template_count': len(entries)}
+                for key, entries in sorted(templates.items())
+            )
+        except (OSError, ValueError, KeyError, StopIteration) as e:
+            if self._snapshot is None:
+                raise
+            logger.error(f"Failed to reload product templates from {self.path}: {str(e)}")
+            self._mtime = mtime  # retry only once the file changes again
+            return
+
+        self._snapshot = (templates, categories, default_key)
+        self._mtime = mtime
+
+template_registry = TemplateRegistry()
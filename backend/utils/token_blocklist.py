@@ -0,0 +1,188 @@
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask.cli import AppGroup
+from models.models import RevokedToken, User, db
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings, for membership checks within one process.
+
+    Uses Python's built-in (per-process salted) string hash with double hashing, which
+    keeps a negative lookup to a few hundred nanoseconds.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add(self, item):
+        """Add an item; ``count`` only grows when it sets a new bit, so re-adding an item
+        (refreshes overlap) does not use up capacity. Returns whether it was new."""
+        added = False
+        for position in self._positions(item, hash(item)):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item):
+        # Most lookups miss, so test the first probe before hashing a second time
+        first = hash(item)
+        position = first % self.size
+        if not self._bits[position >> 3] & (1 << (position & 7)):
+            return False
+        for position in self._positions(item, first):
+            if not self._bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def _positions(self, item, first):
+        second = hash((item, 1)) | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+class TokenBlocklist:
+    """Revoked JWTs, checked on every ``@jwt_required`` request.
+
+    Revoked JTIs live in ``revoked_token`` and in an in-process bloom filter, so a
+    token that was never revoked is rejected from the filter without a query; only
+    filter hits are confirmed against the table. User-wide revocations (every token
+    issued before a point in time) are few and kept exactly in a dict. Every
+    ``refresh_interval`` seconds the filter takes the JTIs revoked since the last
+    refresh and the dict is reloaded; revocations made in this process apply at once.
+    """
+
+    def __init__(self):
+        self.refresh_interval = 5
+        self.capacity = 100000
+        self.error_rate = 0.001
+        self.token_lifetime = timedelta(hours=24)
+        self.sweep_batch_size = 1000
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._user_cutoffs = {}  # str(user_id) -> latest revoked_at (naive UTC)
+        self._watermark = None
+        self._refreshed_at = 0
+
+    def init_app(self, app):
+        """Configure the blocklist from the Flask app config"""
+        self.refresh_interval = app.config.get('JWT_BLOCKLIST_REFRESH_INTERVAL', self.refresh_interval)
+        self.capacity = app.config.get('JWT_BLOCKLIST_BLOOM_CAPACITY', self.capacity)
+        self.error_rate = app.config.get('JWT_BLOCKLIST_BLOOM_ERROR_RATE', self.error_rate)
+        self.token_lifetime = app.config.get('JWT_ACCESS_TOKEN_EXPIRES', self.token_lifetime)
+        self.sweep_batch_size = app.config.get('JWT_BLOCKLIST_SWEEP_BATCH_SIZE', self.sweep_batch_size)
+        self._bloom = None
+        app.extensions['token_blocklist'] = self
+        app.cli.add_command(tokens_cli)
+
+    def token_in_blocklist(self, jwt_header, jwt_payload):
+        """token_in_blocklist_loader callback for flask_jwt_extended"""
+        if self._bloom is None or time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            self.refresh()
+
+        cutoff = self._user_cutoffs.get(str(jwt_payload.get('sub'))) if self._user_cutoffs else None
+        if cutoff is not None and datetime.utcfromtimestamp(jwt_payload.get('iat', 0)) <= cutoff:
+            return True
+
+        jti = jwt_payload.get('jti')
+        if jti is None or jti not in self._bloom:
+            return False
+        return db.session.query(RevokedToken.id).filter_by(jti=jti).first() is not None
+
+    def revoke_token(self, jwt_payload, user_id=None, reason=None):
+        """Revoke one token (flushed with the caller's session)"""
+        jti = jwt_payload['jti']
+        exp = jwt_payload.get('exp')
+        db.session.add(RevokedToken(
+            jti=jti,
+            user_id=user_id,
+            reason=reason,
+            expires_at=datetime.utcfromtimestamp(exp) if exp else datetime.utcnow() + self.token_lifetime
+        ))
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def revoke_user(self, user_id, reason=None):
+        """Revoke every token issued to a user so far (flushed with the caller's session)"""
+        now = datetime.utcnow()
+        db.session.add(RevokedToken(user_id=user_id, reason=reason, revoked_at=now, expires_at=now + self.token_lifetime))
+        with self._lock:
+            self._user_cutoffs[str(user_id)] = now
+
+    def refresh(self):
+        """Add JTIs revoked since the last refresh to the filter and reload user cutoffs"""
+        with self._lock:
+            rebuild = self._bloom is None or self._bloom.count >= self._bloom.capacity
+            since = None if rebuild else self._watermark
+
+        now = datetime.utcnow()
+        query = db.session.query(RevokedToken.jti).filter(
+            RevokedToken.jti.isnot(None), RevokedToken.expires_at > now
+        )
+        if since is not None:
+            # Overlap the previous window so rows committed late are not missed
+            query = query.filter(RevokedToken.revoked_at >= since - timedelta(seconds=60))
+        jtis = [row.jti for row in query.all()]
+
+        cutoffs = db.session.query(
+            RevokedToken.user_id, db.func.max(RevokedToken.revoked_at)
+        ).filter(
+            RevokedToken.jti.is_(None), RevokedToken.expires_at > now
+        ).group_by(RevokedToken.user_id).all()
+
+        with self._lock:
+            if rebuild:
+                capacity = self.capacity
+                while capacity < len(jtis) * 2:
+                    capacity *= 2
+                self._bloom = BloomFilter(capacity, self.error_rate)
+            for jti in jtis:
+                self._bloom.add(jti)
+            self._user_cutoffs = {str(user_id): revoked_at for user_id, revoked_at in cutoffs}
+            self._watermark = now
+            self._refreshed_at = time.monotonic()
+
+    def sweep(self):
+        """Delete revocations whose tokens have expired, in batches; returns the number deleted"""
+        deleted = 0
+        while True:
+            expired = db.select(RevokedToken.id).where(
+                RevokedToken.expires_at <= datetime.utcnow()
+            ).limit(self.sweep_batch_size)
+            count = RevokedToken.query.filter(RevokedToken.id.in_(expired)).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += count
+            if count < self.sweep_batch_size:
+                return deleted
+
+token_blocklist = TokenBlocklist()
+
+tokens_cli = AppGroup('tokens', help='Manage JWT revocations.')
+
+@tokens_cli.command('revoke-user')
+@click.argument('email')
+@click.option('--disable', is_flag=True, help='Also deactivate the account.')
+def revoke_user_command(email, disable):
+    """Revoke every token issued to a user"""
+    user = User.query.filter_by(email=email.lower()).first()
+    if not user:
+        print(f"No user with email {email}")
+        return
+    token_blocklist.revoke_user(user.id, reason='account_disabled' if disable else 'revoked')
+    if disable:
+        user.is_active = False
+    db.session.commit()
+    print(f"Revoked all tokens of {user.email}" + (" and disabled the account" if disable else ""))
+
+@tokens_cli.command('sweep')
+def sweep_command():
+    """Delete revocations of tokens that have expired"""
+    print(f"Deleted {token_blocklist.sweep()} expired revocations")
@@ -0,0 +1,224 @@
+import atexit
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from models.models import LLMUsage, db
+from utils.template_registry import normalize_category
+
+class UsageTracker:
+    """Token accounting for LLM calls.
+
+    Usage rows are buffered in memory and bulk-inserted into ``llm_usage`` when the
+    buffer fills up or ages out. Daily per-user quotas are checked against an in-memory
+    counter that is periodically reconciled with the database, and ``max_tokens`` is
+    sized per category from recently observed completion lengths.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.daily_quota = 0
+        self.flush_size = 50
+        self.flush_interval = 10
+        self.reconcile_interval = 60
+        self.default_max_tokens = 800
+        self.min_max_tokens = 256
+        self.max_tokens_headroom = 1.25
+        self.min_samples = 20
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._flushed_at = time.monotonic()
+        self._counters = {}  # user_id -> [day, tokens, reconciled_at]
+        self._completions = {}  # category key -> recent completion token counts
+
+    def init_app(self, app):
+        """Configure the tracker from the Flask app config"""
+        self.app = app
+        self.daily_quota = app.config.get('LLM_DAILY_TOKEN_QUOTA', self.daily_quota)
+        self.flush_size = app.config.get('LLM_USAGE_FLUSH_SIZE', self.flush_size)
+        self.flush_interval = app.config.get('LLM_USAGE_FLUSH_INTERVAL', self.flush_interval)
+        self.reconcile_interval = app.config.get('LLM_QUOTA_RECONCILE_INTERVAL', self.reconcile_interval)
+        self.default_max_tokens = app.config.get('LLM_MAX_TOKENS', self.default_max_tokens)
+        self.min_max_tokens = app.config.get('LLM_MIN_MAX_TOKENS', self.min_max_tokens)
+        app.extensions['usage_tracker'] = self
+        atexit.register(self._flush_on_exit)
+
+    def record(self, user_id, category, model, prompt_tokens, completion_tokens, max_tokens=None, truncated=False, listings=1, observe=True):
+        """Buffer the usage of one LLM call that produced `listings` products"""
+        total_tokens = prompt_tokens + completion_tokens
+        row = {
+            'user_id': user_id,
+            'category': category,
+            'model': model,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': total_tokens,
+            'max_tokens': max_tokens,
+            'listings': listings,
+            'created_at': datetime.utcnow()
+        }
+        if observe:
+            self.observe(category, completion_tokens, max_tokens, truncated, listings)
+
+        with self._lock:
+            self._buffer.append(row)
+            counter = self._counters.get(user_id)
+            if counter and counter[0] == row['created_at'].date():
+                counter[1] += total_tokens
+            should_flush = (
+                len(self._buffer) >= self.flush_size or
+                time.monotonic() - self._flushed_at >= self.flush_interval
+            )
+
+        if should_flush:
+            try:
+                self.flush()
+            except Exception as e:
+                # The rows stay buffered for the next flush; never fail the caller's request
+                if self.app is not None:
+                    self.app.logger.warning(f"LLM usage flush failed: {str(e)}")
+
+    def observe(self, category, completion_tokens, max_tokens=None, truncated=False, listings=1):
+        """Add a completion length sample for sizing `max_tokens`, without charging anyone"""
+        # A truncated completion says little about the length actually needed, so
+        # record it above the cap to make the next estimate grow
+        observed = int(max_tokens * 1.5) if truncated and max_tokens else completion_tokens
+        observed //= max(listings, 1)
+
+        with self._lock:
+            self._completions.setdefault(normalize_category(category), deque(maxlen=200)).append(observed)
+
+    def charge(self, user_id, category, listings):
+        """Charge the user for listings generated ahead of time (their ``usage`` share)"""
+        by_model = {}
+        for listing in listings:
+            usage = listing.get('usage')
+            if not usage:
+                continue  # Templates cost nothing
+            totals = by_model.setdefault(usage['model'], [0, 0, 0])
+            totals[0] += usage['prompt_tokens']
+            totals[1] += usage['completion_tokens']
+            totals[2] += 1
+
+        for model, (prompt_tokens, completion_tokens, count) in by_model.items():
+            self.record(user_id, category, model, prompt_tokens, completion_tokens, listings=count, observe=False)
+
+    def flush(self):
+        """Bulk insert buffered usage rows in their own transaction"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._flushed_at = time.monotonic()
+
+        if not rows:
+            return 0
+
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(db.insert(LLMUsage), rows)
+        except Exception:
+            with self._lock:
+                self._buffer[:0] = rows
+            raise
+
+        return len(rows)
+
+    def tokens_used_today(self, user_id):
+        """Tokens used by the user today (UTC), from the in-memory counter"""
+        today = datetime.utcnow().date()
+        with self._lock:
+            counter = self._counters.get(user_id)
+            if counter and counter[0] == today and time.monotonic() - counter[2] < self.reconcile_interval:
+                return counter[1]
+
+        return self._reconcile(user_id, today)
+
+    def remaining_quota(self, user_id):
+        """Tokens left in the user's daily quota, or None when quotas are disabled"""
+        if not self.daily_quota:
+            return None
+        return max(self.daily_quota - self.tokens_used_today(user_id), 0)
+
+    def has_quota(self, user_id):
+        """Check whether the user may start another LLM call today"""
+        remaining = self.remaining_quota(user_id)
+        return remaining is None or remaining > 0
+
+    def max_tokens_for(self, category):
+        """Completion limit for a category: observed p95 plus headroom, within bounds"""
+        with self._lock:
+            samples = sorted(self._completions.get(normalize_category(category), ()))
+
+        if len(samples) < self.min_samples:
+            return self.default_max_tokens
+
+        p95 = samples[min(len(samples) - 1, int(math.ceil(len(samples) * 0.95)) - 1)]
+        estimate = int(math.ceil(p95 * self.max_tokens_headroom))
+        return max(self.min_max_tokens, min(estimate, self.default_max_tokens))
+
+    def report(self, user_id, days=30):
+        """Token rollups for a user by day, category and model"""
+        self.flush()
+        since = datetime.utcnow() - timedelta(days=days)
+        base = db.session.query(
+            db.func.count(LLMUsage.id).label('calls'),
+            db.func.coalesce(db.func.sum(LLMUsage.prompt_tokens), 0).label('prompt_tokens'),
+            db.func.coalesce(db.func.sum(LLMUsage.completion_tokens), 0).label('completion_tokens'),
+            db.func.coalesce(db.func.sum(LLMUsage.total_tokens), 0).label('total_tokens'),
+            db.func.coalesce(db.func.sum(LLMUsage.listings), 0).label('listings')
+        ).filter(LLMUsage.user_id == user_id, LLMUsage.created_at >= since)
+
+        def rollup(column):
+            rows = base.add_columns(column).group_by(column).order_by(column).all()
+            return {str(row[-1]): self._totals(row) for row in rows}
+
+        return {
+            'days': days,
+            'totals': self._totals(base.one()),
+            'by_day': rollup(db.func.date(LLMUsage.created_at)),
+            'by_category': rollup(LLMUsage.category),
+            'by_model': rollup(LLMUsage.model),
+            'daily_quota': self.daily_quota or None,
+            'used_today': self.tokens_used_today(user_id),
+            'remaining_today': self.remaining_quota(user_id)
+        }
+
+    def _totals(self, row):
+        listings = int(row.listings)
+        return {
+            'calls': row.calls,
+            'listings': listings,
+            'prompt_tokens': int(row.prompt_tokens),
+            'completion_tokens': int(row.completion_tokens),
+            'total_tokens': int(row.total_tokens),
+            'tokens_per_listing': round(int(row.total_tokens) / listings, 1) if listings else None
+        }
+
+    def _reconcile(self, user_id, today):
+        """Reload the user's counter from the database (plus anything not yet flushed)"""
+        day_start = datetime.combine(today, datetime.min.time())
+        with db.engine.connect() as connection:
+            stored = connection.execute(
+                db.select(db.func.coalesce(db.func.sum(LLMUsage.total_tokens), 0)).where(
+                    LLMUsage.user_id == user_id,
+                    LLMUsage.created_at >= day_start
+                )
+            ).scalar()
+
+        with self._lock:
+            pending = sum(
+                row['total_tokens'] for row in self._buffer
+                if row['user_id'] == user_id and row['created_at'] >= day_start
+            )
+            tokens = int(stored) + pending
+            self._counters[user_id] = [today, tokens, time.monotonic()]
+
+        return tokens
+
+    def _flush_on_exit(self):
+        if self.app is None or not self._buffer:
+            return
+        with self.app.app_context():
+            self.flush()
+
+usage_tracker = UsageTracker()